@@ -1,6 +1,6 @@
 "use client"
 
-import { useState, useEffect } from "react"
+import { useState, useEffect, useRef } from "react"
 import { useRouter } from "next/navigation"
 import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
@@ -26,6 +26,7 @@ interface Order {
   order_number: string
   user_id: string
   items: OrderItem[]
+  item_count?: number
   status: "pending" | "confirmed" | "processing" | "shipped" | "delivered" | "cancelled"
   payment_status: "pending" | "paid" | "failed" | "refunded"
   total: number
@@ -39,6 +40,26 @@ interface Order {
   billing_address?: any
 }
 
+interface OrderSummary {
+  total_orders: number
+  delivered_orders: number
+  pending_orders: number
+  total_spent: number
+}
+
+interface OrdersPage {
+  orders: Order[]
+  total: number
+  next_cursor: string | null
+  summary?: OrderSummary
+}
+
+interface OrdersQuery {
+  cursor?: string
+  status?: string
+  search?: string
+}
+
 // Orders API Service
 class OrdersApiService {
   private static readonly API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000"
@@ -84,13 +105,18 @@ class OrdersApiService {
     }
   }
 
-  static async getMyOrders(): Promise<Order[]> {
-    try {
-      const response = await this.apiRequest('/orders/my-orders')
-      return response.orders || []
-    } catch (error) {
-      console.error("Failed to get orders:", error)
-      return []
+  // One page of order summaries; follow next_cursor for older orders
+  static async getMyOrders(query: OrdersQuery = {}): Promise<OrdersPage> {
+    const params = new URLSearchParams()
+    Object.entries(query).forEach(([key, value]) => {
+      if (value) params.set(key, value)
+    })
+    const response = (await this.apiRequest(`/orders/my-orders?${params.toString()}`)) || {}
+    return {
+      orders: response.orders || [],
+      total: response.total || 0,
+      next_cursor: response.next_cursor || null,
+      summary: response.summary,
     }
   }
 
@@ -108,25 +134,34 @@ class OrdersApiService {
 function OrdersContent() {
   const router = useRouter()
   const [orders, setOrders] = useState<Order[]>([])
-  const [filteredOrders, setFilteredOrders] = useState<Order[]>([])
+  const [summary, setSummary] = useState<OrderSummary | null>(null)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const [loading, setLoading] = useState(true)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [searchQuery, setSearchQuery] = useState("")
   const [statusFilter, setStatusFilter] = useState("all")
+  // Ignores responses for filters the user has already changed
+  const requestId = useRef(0)
 
+  // Filters run on the server so they cover every order, not just loaded pages
   useEffect(() => {
-    loadOrders()
-  }, [])
+    const timer = setTimeout(loadOrders, searchQuery ? 300 : 0)
+    return () => clearTimeout(timer)
+  }, [searchQuery, statusFilter])
 
-  useEffect(() => {
-    filterOrders()
-  }, [orders, searchQuery, statusFilter])
+  const currentFilters = (): OrdersQuery => ({
+    status: statusFilter !== "all" ? statusFilter : undefined,
+    search: searchQuery.trim() || undefined,
+  })
 
   const loadOrders = async () => {
+    const request = ++requestId.current
     try {
-      setLoading(true)
-      const ordersData = await OrdersApiService.getMyOrders()
-      setOrders(ordersData)
-      setFilteredOrders(ordersData)
+      const page = await OrdersApiService.getMyOrders(currentFilters())
+      if (request !== requestId.current) return
+      setOrders(page.orders)
+      setNextCursor(page.next_cursor)
+      if (page.summary) setSummary(page.summary)
     } catch (error) {
       console.error("Failed to load orders:", error)
       toast({
@@ -139,27 +174,29 @@ function OrdersContent() {
     }
   }
 
-  const filterOrders = () => {
-    let filtered = orders
-
-    // Filter by search query
-    if (searchQuery) {
-      filtered = filtered.filter(
-        (order) =>
-          order._id.toLowerCase().includes(searchQuery.toLowerCase()) ||
-          order.order_number.toLowerCase().includes(searchQuery.toLowerCase()) ||
-          order.items.some((item) => item.product_name.toLowerCase().includes(searchQuery.toLowerCase())),
-      )
-    }
-
-    // Filter by status
-    if (statusFilter !== "all") {
-      filtered = filtered.filter((order) => order.status === statusFilter)
+  const loadMoreOrders = async () => {
+    if (!nextCursor) return
+    const request = requestId.current
+    try {
+      setLoadingMore(true)
+      const page = await OrdersApiService.getMyOrders({ ...currentFilters(), cursor: nextCursor })
+      if (request !== requestId.current) return
+      setOrders((loaded) => [...loaded, ...page.orders])
+      setNextCursor(page.next_cursor)
+    } catch (error) {
+      console.error("Failed to load more orders:", error)
+      toast({
+        variant: "destructive",
+        title: "Error",
+        description: "Failed to load more orders. Please try again later."
+      })
+    } finally {
+      setLoadingMore(false)
     }
-
-    setFilteredOrders(filtered)
   }
 
+  const hasOrders = (summary?.total_orders ?? 0) > 0
+
   const getStatusIcon = (status: Order["status"]) => {
     switch (status) {
       case "pending":
@@ -244,14 +281,14 @@ function OrdersContent() {
         </div>
 
         {/* Summary Stats */}
-        {orders.length > 0 && (
+        {summary && hasOrders && (
           <div className="grid grid-cols-1 md:grid-cols-4 gap-6 mb-8">
             <Card className="bg-gradient-to-br from-blue-50 to-blue-100 border-blue-200">
               <CardHeader className="pb-2">
                 <CardTitle className="text-sm font-medium text-blue-700">Total Orders</CardTitle>
               </CardHeader>
               <CardContent>
-                <div className="text-2xl font-bold text-blue-900">{orders.length}</div>
+                <div className="text-2xl font-bold text-blue-900">{summary.total_orders}</div>
               </CardContent>
             </Card>
 
@@ -261,7 +298,7 @@ function OrdersContent() {
               </CardHeader>
               <CardContent>
                 <div className="text-2xl font-bold text-green-900">
-                  {orders.filter(o => o.status === "delivered").length}
+                  {summary.delivered_orders}
                 </div>
               </CardContent>
             </Card>
@@ -272,7 +309,7 @@ function OrdersContent() {
               </CardHeader>
               <CardContent>
                 <div className="text-2xl font-bold text-yellow-900">
-                  {orders.filter(o => ["pending", "confirmed", "processing"].includes(o.status)).length}
+                  {summary.pending_orders}
                 </div>
               </CardContent>
             </Card>
@@ -283,7 +320,7 @@ function OrdersContent() {
               </CardHeader>
               <CardContent>
                 <div className="text-2xl font-bold text-purple-900">
-                  ${orders.reduce((sum, order) => sum + order.total, 0).toFixed(2)}
+                  ${summary.total_spent.toFixed(2)}
                 </div>
               </CardContent>
             </Card>
@@ -321,18 +358,18 @@ function OrdersContent() {
         </div>
 
         {/* Orders List */}
-        {filteredOrders.length === 0 ? (
+        {orders.length === 0 ? (
           <div className="text-center py-16">
             <Package className="h-24 w-24 text-slate-400 mx-auto mb-6" />
             <h2 className="font-heading font-bold text-2xl text-slate-900 mb-4">
-              {orders.length === 0 ? "No orders yet" : "No orders found"}
+              {!hasOrders ? "No orders yet" : "No orders found"}
             </h2>
             <p className="text-slate-600 mb-8">
-              {orders.length === 0
+              {!hasOrders
                 ? "When you place orders, they will appear here."
                 : "Try adjusting your search or filter criteria."}
             </p>
-            {orders.length === 0 && (
+            {!hasOrders && (
               <Button onClick={() => router.push("/products")} size="lg">
                 Start Shopping
               </Button>
@@ -340,7 +377,7 @@ function OrdersContent() {
           </div>
         ) : (
           <div className="space-y-6">
-            {filteredOrders.map((order) => (
+            {orders.map((order) => (
               <Card key={order._id} className="shadow-lg border-0 bg-white/80 backdrop-blur-sm">
                 <CardHeader>
                   <div className="flex items-center justify-between">
@@ -355,7 +392,7 @@ function OrdersContent() {
                         </div>
                         <div className="flex items-center gap-1">
                           <Package className="h-4 w-4" />
-                          {order.items.length} item{order.items.length !== 1 ? "s" : ""}
+                          {order.item_count ?? order.items.length} item{(order.item_count ?? order.items.length) !== 1 ? "s" : ""}
                         </div>
                       </div>
                     </div>
@@ -399,9 +436,9 @@ function OrdersContent() {
                           </div>
                         </div>
                       ))}
-                      {order.items.length > 3 && (
+                      {(order.item_count ?? order.items.length) > 3 && (
                         <div className="flex items-center justify-center p-2 bg-slate-100 rounded text-slate-600 text-sm">
-                          +{order.items.length - 3} more items
+                          +{(order.item_count ?? order.items.length) - 3} more items
                         </div>
                       )}
                     </div>
@@ -462,6 +499,14 @@ function OrdersContent() {
                 </CardContent>
               </Card>
             ))}
+
+            {nextCursor && (
+              <div className="text-center">
+                <Button variant="outline" onClick={loadMoreOrders} disabled={loadingMore}>
+                  {loadingMore ? "Loading..." : "Load more orders"}
+                </Button>
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -1,15 +1,26 @@
 """
 Database connection and models for Glonix Electronics
+
+All operations use the Motor driver so that routes can await them without
+blocking the event loop.
 """
 
+import asyncio
+import base64
+import json
 import os
-from datetime import datetime
-from typing import Optional, List, Dict, Any
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+import re
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Callable
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, TEXT, ReturnDocument, UpdateOne
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, OperationFailure
 from bson import ObjectId
 import logging
 
+from services.catalogue_cache import catalogue_cache
+from services.principal_cache import principal_cache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,76 +28,520 @@ logger = logging.getLogger(__name__)
 # Database configuration
 DATABASE_NAME = os.getenv("DATABASE_NAME", "glonix_electronics") 
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27018")
+# "text" uses the weighted text index, "regex" forces the legacy $regex scan
+PRODUCT_SEARCH_MODE = os.getenv("PRODUCT_SEARCH_MODE", "text")
+# Order numbers leased from the counter document per round trip
+ORDER_NUMBER_BLOCK_SIZE = int(os.getenv("ORDER_NUMBER_BLOCK_SIZE", "20"))
+# How long a checkout idempotency key is remembered
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", str(24 * 60 * 60)))
+# How long reserved stock is held for a payment that has not completed
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+
+# Materialized admin dashboard counters
+ADMIN_STATS_ID = "admin_overview"
+REVENUE_STATUSES = ("delivered", "completed")
+LOW_STOCK_THRESHOLD = 20
+
+# Product fields copied onto cart items, mapped to their cart item names.
+# Changing any of them bumps the product's price_version.
+CART_SNAPSHOT_FIELDS = {
+    "name": "product_name",
+    "sku": "product_sku",
+    "price": "price",
+    "image": "image"
+}
+
+def cart_item_snapshot(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Product details stored on a cart item, stamped with the product version"""
+    snapshot = {
+        item_field: product.get(product_field, "" if product_field == "image" else None)
+        for product_field, item_field in CART_SNAPSHOT_FIELDS.items()
+    }
+    snapshot["product_version"] = product.get("price_version", 0)
+    return snapshot
+
+def apply_product_snapshots(items: List[Dict[str, Any]], products: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Refresh cart items in place from changed products; returns the refreshed items"""
+    refreshed = []
+    for item in items:
+        product = products.get(item.get("product_id"))
+        if product is None or product.get("price_version", 0) <= item.get("product_version", 0):
+            continue
+        item.update(cart_item_snapshot(product))
+        refreshed.append(item)
+    return refreshed
+
+def _order_counters(order: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Dashboard counters an order contributes to"""
+    if not order:
+        return {"pending_orders": 0, "total_revenue": 0.0}
+    status = order.get("status")
+    return {
+        "pending_orders": 1 if status == "pending" else 0,
+        "total_revenue": float(order.get("total", 0.0)) if status in REVENUE_STATUSES else 0.0
+    }
+
+def _product_counters(product: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Dashboard counters a product contributes to"""
+    stock = (product or {}).get("stock_quantity", 0) or 0
+    return {"low_stock_products": 1 if 0 < stock < LOW_STOCK_THRESHOLD else 0}
+
+def _enquiry_counters(enquiry: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Dashboard counters an enquiry's status contributes to"""
+    return {"new_enquiries": 1 if (enquiry or {}).get("status") == "new" else 0}
+
+def _counter_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: after[key] - before[key] for key in after}
+
+class SequenceAllocator:
+    """Hands out unique sequence numbers leased in blocks from a counter document
+    
+    Each lease is a single atomic $inc on the counters collection, so
+    concurrent workers never receive the same number. Numbers left in a
+    block when a worker exits are skipped, not reused.
+    """
+
+    def __init__(self, counters, block_size: int = ORDER_NUMBER_BLOCK_SIZE):
+        self.counters = counters
+        self.block_size = max(block_size, 1)
+        self._blocks: Dict[str, List[int]] = {}
+        self._lock = asyncio.Lock()
+
+    async def seed(self, key: str, minimum: int):
+        """Make sure the counter never hands out numbers at or below minimum"""
+        await self.counters.update_one({"_id": key}, {"$max": {"seq": minimum}}, upsert=True)
+
+    async def next(self, key: str) -> int:
+        async with self._lock:
+            block = self._blocks.get(key)
+            if not block or block[0] > block[1]:
+                counter = await self.counters.find_one_and_update(
+                    {"_id": key},
+                    {"$inc": {"seq": self.block_size}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                block = [counter["seq"] - self.block_size + 1, counter["seq"]]
+                self._blocks[key] = block
+            
+            value = block[0]
+            block[0] += 1
+            return value
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+class InsufficientStock(ValueError):
+    """Raised when a reservation cannot be met from current stock"""
+    def __init__(self, product_ids: List[str]):
+        self.product_ids = product_ids
+        super().__init__(f"Insufficient stock for products: {', '.join(product_ids)}")
+
+class ReservationExpired(ValueError):
+    """Raised when committing a reservation that was already released"""
+
+class IdempotencyKeyReused(ValueError):
+    """Raised when an idempotency key is replayed with a different request"""
+
+def _stock_move(quantity: int) -> List[Dict[str, Any]]:
+    """Update pipeline moving quantity from stock_quantity to reserved_quantity
+    
+    A negative quantity moves it back. inStock follows the new stock level,
+    and updated_at changes so cached product JSON is rebuilt. Products
+    without a stock_quantity don't track stock: only their
+    reserved_quantity moves.
+    """
+    tracked = {"$ne": [{"$ifNull": ["$stock_quantity", None]}, None]}
+    return [
+        {"$set": {
+            "stock_quantity": {"$cond": [tracked, {"$subtract": ["$stock_quantity", quantity]}, "$$REMOVE"]},
+            "reserved_quantity": {"$add": [{"$ifNull": ["$reserved_quantity", 0]}, quantity]},
+            "inStock": {"$cond": [
+                tracked,
+                {"$gt": [{"$subtract": ["$stock_quantity", quantity]}, 0]},
+                {"$ifNull": ["$inStock", True]}
+            ]},
+            "updated_at": datetime.utcnow()
+        }}
+    ]
+
+# Fields a stock reservation writes; changes to only these touch one product
+STOCK_FIELDS = {"stock_quantity", "reserved_quantity", "inStock", "updated_at"}
+
+def _stock_only_change(change: Dict[str, Any]) -> Optional[str]:
+    """The product id of a change stream event that only moved stock, else None"""
+    if change.get("operationType") != "update":
+        return None
+    description = change.get("updateDescription", {})
+    changed = set(description.get("updatedFields", {})) | set(description.get("removedFields", []))
+    if not changed <= STOCK_FIELDS:
+        return None
+    return str(change["documentKey"]["_id"])
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    """Encode the (created_at, _id) position of a document as an opaque cursor"""
+    position = {"c": document["created_at"].isoformat(), "i": str(document["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode an opaque cursor back into its (created_at, _id) position"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(position["c"]), ObjectId(position["i"])
+    except Exception:
+        raise InvalidCursor("Invalid pagination cursor")
+
+# Newest first, with _id breaking ties so keyset pages are stable
+KEYSET_SORT = [("created_at", -1), ("_id", -1)]
+
+# Order history rows: totals and status plus the first few items as a
+# preview; the full order is read from get_order_by_id
+ORDER_SUMMARY_PREVIEW_ITEMS = 3
+ORDER_SUMMARY_PROJECTION = {
+    "order_number": 1,
+    "status": 1,
+    "payment_status": 1,
+    "subtotal": 1,
+    "shipping_cost": 1,
+    "tax": 1,
+    "total": 1,
+    "tracking_number": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "items": {"$slice": [{"$ifNull": ["$items", []]}, ORDER_SUMMARY_PREVIEW_ITEMS]},
+    "item_count": {"$size": {"$ifNull": ["$items", []]}}
+}
+
+# Fields needed to build a UserResponse for admin listings
+USER_LIST_PROJECTION = {
+    "email": 1,
+    "full_name": 1,
+    "company": 1,
+    "phone": 1,
+    "role": 1,
+    "is_active": 1,
+    "fabrication_status": 1,
+    "created_at": 1,
+    "updated_at": 1
+}
 
 class DatabaseManager:
-    """MongoDB database manager"""
+    """Async MongoDB database manager"""
     
     def __init__(self):
         self.client = None
         self.db = None
+        self.text_search_enabled = PRODUCT_SEARCH_MODE == "text"
+        self.transactions_enabled = True
         self.connect()
+        self.order_numbers = SequenceAllocator(self.db.counters)
+        self._seeded_order_years = set()
     
     def connect(self):
-        """Connect to MongoDB"""
+        """Create the MongoDB client (connections are opened lazily)"""
+        self.client = AsyncIOMotorClient(MONGODB_URL)
+        self.db = self.client[DATABASE_NAME]
+    
+    async def ping(self):
+        """Test the MongoDB connection"""
         try:
-            self.client = MongoClient(MONGODB_URL)
-            # Test connection
-            self.client.admin.command('ping')
-            self.db = self.client[DATABASE_NAME]
+            await self.client.admin.command('ping')
             logger.info(f"Connected to MongoDB at {MONGODB_URL}")
         except ConnectionFailure as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise
     
+    async def ensure_indexes(self):
+        """Create the indexes the query methods rely on"""
+        try:
+            await self.db.products.create_index(
+                [("name", TEXT), ("sku", TEXT), ("description", TEXT), ("category", TEXT)],
+                weights={"name": 10, "sku": 8, "category": 3, "description": 1},
+                name="product_search"
+            )
+        except OperationFailure as e:
+            logger.warning(f"Failed to create product search indexes, using regex search: {e}")
+            self.text_search_enabled = False
+        
+        keyset = [("created_at", DESCENDING), ("_id", DESCENDING)]
+        indexes = [
+            ("products", [("sku", ASCENDING)], {}),
+            ("products", keyset, {}),
+            ("products", [("category", ASCENDING)] + keyset, {}),
+            ("orders", [("order_number", ASCENDING)], {"unique": True}),
+            ("orders", keyset, {}),
+            ("orders", [("status", ASCENDING)] + keyset, {}),
+            ("orders", [("user_id", ASCENDING)] + keyset, {}),
+            ("enquiries", keyset, {}),
+            ("enquiries", [("enquiry_type", ASCENDING)] + keyset, {}),
+            ("enquiries", [("status", ASCENDING)] + keyset, {}),
+            ("users", keyset, {}),
+            ("users", [("fabrication_status", ASCENDING), ("role", ASCENDING)] + keyset, {}),
+            ("contact_messages", keyset, {}),
+            ("orders", [("razorpay_payment_id", ASCENDING)], {
+                "unique": True,
+                "partialFilterExpression": {"razorpay_payment_id": {"$type": "string"}}
+            }),
+            ("idempotency_keys", [("created_at", ASCENDING)], {"expireAfterSeconds": IDEMPOTENCY_KEY_TTL_SECONDS}),
+            ("stock_reservations", [("status", ASCENDING), ("expires_at", ASCENDING)], {}),
+            ("stock_reservations", [("user_id", ASCENDING), ("status", ASCENDING)], {}),
+            ("stock_reservations", [("reference", ASCENDING)], {}),
+        ]
+        # Built one by one so that a failure only costs the index it hit
+        for collection, keys, options in indexes:
+            try:
+                await self.db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                logger.warning(f"Failed to create index {keys} on {collection}: {e}")
+        
+        await self.ensure_unique_cart_index()
+    
+    async def ensure_unique_cart_index(self, attempts: int = 3):
+        """Build the unique carts.user_id index, merging duplicate carts first
+        
+        push_cart_item upserts carts by user_id, which is only safe with this
+        index in place, so failing to build it stops startup.
+        """
+        for attempt in range(attempts):
+            try:
+                await self.db.carts.create_index([("user_id", ASCENDING)], unique=True)
+                return
+            except DuplicateKeyError:
+                # Carts left by the old insert-on-read race
+                await self.merge_duplicate_carts()
+            except OperationFailure as e:
+                raise RuntimeError(f"Failed to create the unique carts.user_id index: {e}") from e
+        raise RuntimeError("Failed to create the unique carts.user_id index: duplicate carts keep appearing")
+    
+    async def merge_duplicate_carts(self) -> int:
+        """Fold each user's duplicate carts into their most recently updated one
+        
+        Items are unioned; a product held in several carts keeps the line
+        from the newest cart. Returns the number of carts removed.
+        """
+        pipeline = [
+            {"$group": {"_id": "$user_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}}
+        ]
+        removed = 0
+        async for group in self.db.carts.aggregate(pipeline, allowDiskUse=True):
+            carts = await self.db.carts.find({"_id": {"$in": group["ids"]}}).sort(
+                [("updated_at", DESCENDING), ("_id", DESCENDING)]
+            ).to_list(length=None)
+            keeper, duplicates = carts[0], carts[1:]
+            items = list(keeper.get("items", []))
+            seen = {item.get("product_id") for item in items}
+            for cart in duplicates:
+                for item in cart.get("items", []):
+                    if item.get("product_id") not in seen:
+                        seen.add(item.get("product_id"))
+                        items.append(item)
+            
+            await self.db.carts.update_one(
+                {"_id": keeper["_id"]},
+                {"$set": {"items": items, "updated_at": datetime.utcnow()}}
+            )
+            await self.db.carts.delete_many({"_id": {"$in": [cart["_id"] for cart in duplicates]}})
+            removed += len(duplicates)
+        
+        if removed:
+            logger.warning(f"Merged {removed} duplicate carts")
+        return removed
+    
     def close(self):
         """Close database connection"""
         if self.client:
             self.client.close()
             logger.info("Database connection closed")
     
+    # Materialized admin stats
+    async def _bump_stats(self, counters: Dict[str, Any]):
+        """Apply counter increments to the materialized admin stats document
+        
+        Nothing is written until the document exists; the reconciliation
+        job creates it from a full recount.
+        """
+        inc = {key: value for key, value in counters.items() if value}
+        if not inc:
+            return
+        try:
+            await self.db.stats.update_one({"_id": ADMIN_STATS_ID}, {"$inc": inc})
+        except Exception as e:
+            logger.error(f"Failed to update admin stats: {e}")
+
+    async def reconcile_admin_stats(self) -> Dict[str, Any]:
+        """Recount every dashboard counter and store the result"""
+        stats = await self.get_admin_stats()
+        if not stats:
+            return {}
+        
+        stats["total_enquiries"] = await self.get_enquiries_count()
+        stats["new_enquiries"] = await self.get_enquiries_count(status="new")
+        stats["design_enquiries"] = await self.get_enquiries_count(enquiry_type="design_enquiry")
+        stats["product_enquiries"] = await self.get_enquiries_count(enquiry_type="product_enquiry")
+        stats["reconciled_at"] = datetime.utcnow()
+        
+        try:
+            await self.db.stats.replace_one({"_id": ADMIN_STATS_ID}, stats, upsert=True)
+        except Exception as e:
+            logger.error(f"Failed to store admin stats: {e}")
+        return stats
+
+    async def get_materialized_admin_stats(self) -> Dict[str, Any]:
+        """Read the materialized admin stats, recounting if they do not exist yet"""
+        try:
+            stats = await self.db.stats.find_one({"_id": ADMIN_STATS_ID})
+            if stats:
+                return stats
+        except Exception as e:
+            logger.error(f"Failed to read admin stats: {e}")
+        return await self.reconcile_admin_stats()
+
+    # Pagination
+    async def paginate(
+        self,
+        collection: str,
+        query: Dict[str, Any],
+        skip: int = 0,
+        limit: int = 100,
+        sort: Optional[List[tuple]] = None,
+        projection: Optional[Dict[str, Any]] = None,
+        estimate_count: bool = False,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Get one page of documents and the total match count in a single round trip
+        
+        The page and the count come from one $facet aggregation. With
+        estimate_count, unfiltered lists read the total from collection
+        metadata instead of counting documents.
+        
+        Passing a cursor (the next_cursor of the previous page) switches to
+        keyset pagination on (created_at, _id): skip is ignored and the page
+        is read straight from the index, so deep pages cost the same as the
+        first one.
+        """
+        sort = sort or KEYSET_SORT
+        coll = self.db[collection]
+        
+        if cursor is not None:
+            created_at, last_id = decode_cursor(cursor)
+            after = {"$or": [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": last_id}}
+            ]}
+            page_query = {"$and": [query, after]} if query else after
+            
+            find_cursor = coll.find(page_query, projection).sort(KEYSET_SORT).limit(limit)
+            if estimate_count and not query:
+                count = coll.estimated_document_count()
+            else:
+                count = coll.count_documents(query)
+            items, total = await asyncio.gather(find_cursor.to_list(length=None), count)
+        elif estimate_count and not query:
+            find_cursor = coll.find(query, projection).sort(sort).skip(skip).limit(limit)
+            items, total = await asyncio.gather(
+                find_cursor.to_list(length=None),
+                coll.estimated_document_count()
+            )
+        else:
+            page_stages = [{"$skip": skip}, {"$limit": limit}]
+            if projection:
+                page_stages.append({"$project": projection})
+            
+            pipeline = [
+                {"$match": query},
+                {"$sort": dict(sort)},
+                {"$facet": {
+                    "items": page_stages,
+                    "total": [{"$count": "count"}]
+                }}
+            ]
+            result = await coll.aggregate(pipeline).to_list(length=1)
+            facet = result[0] if result else {"items": [], "total": []}
+            items = facet["items"]
+            total = facet["total"][0]["count"] if facet["total"] else 0
+        
+        # Only keyset-ordered pages can be continued with a cursor
+        next_cursor = None
+        if len(items) == limit and sort == KEYSET_SORT and "created_at" in items[-1]:
+            next_cursor = encode_cursor(items[-1])
+        
+        # Convert ObjectId to string
+        for item in items:
+            item["_id"] = str(item["_id"])
+        
+        return {"items": items, "total": total, "next_cursor": next_cursor}
+
+    async def hydrate_users(self, items: List[Dict[str, Any]], user_field: str = "user_id") -> List[Dict[str, Any]]:
+        """Attach user_name and user_email to each item with one batched user lookup"""
+        user_ids = set()
+        for item in items:
+            try:
+                user_ids.add(ObjectId(item.get(user_field)))
+            except Exception:
+                continue
+        
+        users = {}
+        if user_ids:
+            cursor = self.db.users.find(
+                {"_id": {"$in": list(user_ids)}},
+                {"full_name": 1, "email": 1}
+            )
+            async for user in cursor:
+                users[str(user["_id"])] = user
+        
+        for item in items:
+            user = users.get(str(item.get(user_field)))
+            item["user_name"] = user.get("full_name", "Unknown User") if user else "Unknown User"
+            item["user_email"] = user.get("email", "unknown@email.com") if user else "unknown@email.com"
+        
+        return items
+
     # User operations
-    def create_user(self, user_data: Dict[str, Any]) -> str:
+    async def create_user(self, user_data: Dict[str, Any]) -> str:
         """Create a new user"""
         user_data["created_at"] = datetime.utcnow()
         user_data["updated_at"] = datetime.utcnow()
         user_data["is_active"] = True
         
-        result = self.db.users.insert_one(user_data)
+        result = await self.db.users.insert_one(user_data)
+        await self._bump_stats({"total_users": 1})
         logger.info(f"User created with ID: {result.inserted_id}")
         return str(result.inserted_id)
     
-    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+    async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get user by email"""
-        return self.db.users.find_one({"email": email})
+        return await self.db.users.find_one({"email": email})
     
-    def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
         try:
-            return self.db.users.find_one({"_id": ObjectId(user_id)})
+            return await self.db.users.find_one({"_id": ObjectId(user_id)})
         except Exception:
             return None
     
-    def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
+    async def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
         """Update user data"""
         update_data["updated_at"] = datetime.utcnow()
         
         try:
-            result = self.db.users.update_one(
+            result = await self.db.users.update_one(
                 {"_id": ObjectId(user_id)},
                 {"$set": update_data}
             )
+            principal_cache.invalidate_user_id(user_id)
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Failed to update user {user_id}: {e}")
             return False
     
-    def get_all_users(self, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+    async def get_all_users(self, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """Get all users with pagination"""
         try:
-            users = list(self.db.users.find(
+            users = await self.db.users.find(
                 {},
                 {"hashed_password": 0}  # Exclude password hash
-            ).skip(skip).limit(limit).sort("created_at", -1))
+            ).skip(skip).limit(limit).sort("created_at", -1).to_list(length=None)
             
             # Convert ObjectId to string
             for user in users:
@@ -97,65 +552,140 @@ class DatabaseManager:
             logger.error(f"Failed to get all users: {e}")
             return []
     
-    def delete_user(self, user_id: str) -> bool:
+    def _build_user_query(self, role: Optional[str] = None, is_active: Optional[bool] = None, fabrication_status: Optional[int] = None) -> Dict[str, Any]:
+        """Build the user filter for the admin listing"""
+        query = {}
+        if role:
+            query["role"] = role
+        if is_active is not None:
+            query["is_active"] = is_active
+        if fabrication_status is not None:
+            query["fabrication_status"] = fabrication_status
+        return query
+
+    async def get_users_count(self, role: Optional[str] = None, is_active: Optional[bool] = None, fabrication_status: Optional[int] = None) -> int:
+        """Get total user count"""
+        try:
+            query = self._build_user_query(role, is_active, fabrication_status)
+            if not query:
+                return await self.db.users.estimated_document_count()
+            return await self.db.users.count_documents(query)
+        except Exception as e:
+            logger.error(f"Failed to get users count: {e}")
+            return 0
+
+    async def get_users_page(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, role: Optional[str] = None, is_active: Optional[bool] = None, fabrication_status: Optional[int] = None) -> Dict[str, Any]:
+        """Get a page of users (listing fields only) and the total count"""
+        try:
+            query = self._build_user_query(role, is_active, fabrication_status)
+            return await self.paginate(
+                "users", query, skip, limit,
+                projection=USER_LIST_PROJECTION,
+                estimate_count=True,
+                cursor=cursor
+            )
+        except InvalidCursor:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to get users page: {e}")
+            return {"items": [], "total": 0, "next_cursor": None}
+
+    async def delete_user(self, user_id: str) -> bool:
         """Delete user"""
         try:
-            result = self.db.users.delete_one({"_id": ObjectId(user_id)})
+            result = await self.db.users.delete_one({"_id": ObjectId(user_id)})
+            principal_cache.invalidate_user_id(user_id)
+            if result.deleted_count:
+                await self._bump_stats({"total_users": -1})
             return result.deleted_count > 0
         except Exception as e:
             logger.error(f"Failed to delete user {user_id}: {e}")
             return False
     
-    def get_users_by_fabrication_status(self, status: int) -> List[Dict[str, Any]]:
-        """Get users by fabrication status"""
+    async def get_users_by_fabrication_status(self, status: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get a page of non-admin users by fabrication status and the total count"""
         try:
-            users = list(self.db.users.find({
-                "fabrication_status": status,
-                "role": {"$ne": "admin"}  # Exclude admin users
-            }).sort("created_at", -1))
-            
-            # Convert ObjectId to string and remove password hash
-            for user in users:
-                user["_id"] = str(user["_id"])
-                user.pop("hashed_password", None)
-            
-            return users
+            return await self.paginate(
+                "users",
+                {
+                    "fabrication_status": status,
+                    "role": {"$ne": "admin"}  # Exclude admin users
+                },
+                skip, limit,
+                projection={"hashed_password": 0},  # Exclude password hash
+                cursor=cursor
+            )
+        except InvalidCursor:
+            raise
         except Exception as e:
             logger.error(f"Failed to get users by fabrication status {status}: {e}")
-            return []
+            return {"items": [], "total": 0, "next_cursor": None}
 
     # Product operations - Enhanced for public access
-    def create_product(self, product_data: Dict[str, Any]) -> str:
+    async def create_product(self, product_data: Dict[str, Any]) -> str:
         """Create a new product"""
         product_data["created_at"] = datetime.utcnow()
         product_data["updated_at"] = datetime.utcnow()
+        product_data["price_version"] = 1
         
-        result = self.db.products.insert_one(product_data)
+        result = await self.db.products.insert_one(product_data)
+        catalogue_cache.bump()
+        await self._bump_stats({"total_products": 1, **_product_counters(product_data)})
         logger.info(f"Product created with ID: {result.inserted_id}")
         return str(result.inserted_id)
 
-    def get_all_products(self, skip: int = 0, limit: int = 100, category: Optional[str] = None, search: Optional[str] = None) -> List[Dict[str, Any]]:
+    def _build_product_query(self, category: Optional[str], search: Optional[str], use_text_index: bool) -> Dict[str, Any]:
+        """Build the product filter for a category and search term"""
+        query = {}
+        
+        # Add category filter
+        if category:
+            query["category"] = category
+        
+        # Add search functionality
+        if search and use_text_index:
+            # Text index match, or an index-served prefix match on the SKU
+            query["$or"] = [
+                {"$text": {"$search": search}},
+                {"sku": {"$regex": f"^{re.escape(search.strip().upper())}"}}
+            ]
+        elif search:
+            query["$or"] = [
+                {"name": {"$regex": search, "$options": "i"}},
+                {"sku": {"$regex": search, "$options": "i"}},
+                {"description": {"$regex": search, "$options": "i"}},
+                {"category": {"$regex": search, "$options": "i"}}
+            ]
+        
+        return query
+    
+    def _disable_text_search(self, error: OperationFailure):
+        """Fall back to regex search when the text index is unavailable"""
+        logger.warning(f"Product text search unavailable, falling back to regex: {error}")
+        self.text_search_enabled = False
+
+    async def get_all_products(self, skip: int = 0, limit: int = 100, category: Optional[str] = None, search: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all products with pagination, category filter, and search"""
         try:
-            query = {}
+            use_text_index = bool(search) and self.text_search_enabled
+            query = self._build_product_query(category, search, use_text_index)
             
-            # Add category filter
-            if category:
-                query["category"] = category
-            
-            # Add search functionality
-            if search:
-                query["$or"] = [
-                    {"name": {"$regex": search, "$options": "i"}},
-                    {"sku": {"$regex": search, "$options": "i"}},
-                    {"description": {"$regex": search, "$options": "i"}},
-                    {"category": {"$regex": search, "$options": "i"}}
-                ]
-                
-            products = list(self.db.products.find(query)
+            # Rank search results by relevance, newest first otherwise
+            sort = [("created_at", -1)]
+            if use_text_index:
+                sort.insert(0, ("score", {"$meta": "textScore"}))
+            
+            cursor = (self.db.products.find(query)
+                        .sort(sort)
                         .skip(skip)
-                        .limit(limit)
-                        .sort("created_at", -1))
+                        .limit(limit))
+            try:
+                products = await cursor.to_list(length=None)
+            except OperationFailure as e:
+                if not use_text_index:
+                    raise
+                self._disable_text_search(e)
+                return await self.get_all_products(skip, limit, category, search)
             
             # Convert ObjectId to string
             for product in products:
@@ -166,76 +696,193 @@ class DatabaseManager:
             logger.error(f"Failed to get products: {e}")
             return []
 
-    def get_product_by_id(self, product_id: str) -> Optional[Dict[str, Any]]:
-        """Get product by ID"""
+    async def get_products_page(self, skip: int = 0, limit: int = 100, category: Optional[str] = None, search: Optional[str] = None, estimate_count: bool = False, cursor: Optional[str] = None, projection: Optional[Dict[str, Any]] = None, raise_errors: bool = False) -> Dict[str, Any]:
+        """Get a page of products and the total count in one query
+        
+        A projection must keep created_at for the page to return a cursor.
+        Query errors return an empty page unless raise_errors is set, which
+        callers that cache the result use so a failure is never stored.
+        """
+        try:
+            use_text_index = bool(search) and self.text_search_enabled
+            query = self._build_product_query(category, search, use_text_index)
+            
+            # Relevance ranking applies to offset pages; cursor pages stay in keyset order
+            sort = KEYSET_SORT
+            if use_text_index and cursor is None:
+                sort = [("score", {"$meta": "textScore"})] + KEYSET_SORT
+            
+            try:
+                return await self.paginate("products", query, skip, limit, sort, projection, estimate_count=estimate_count, cursor=cursor)
+            except OperationFailure as e:
+                if not use_text_index:
+                    raise
+                self._disable_text_search(e)
+                return await self.get_products_page(skip, limit, category, search, estimate_count, cursor, projection, raise_errors)
+        except InvalidCursor:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to get products page: {e}")
+            if raise_errors:
+                raise
+            return {"items": [], "total": 0, "next_cursor": None}
+
+    async def get_product_by_id(self, product_id: str, raise_errors: bool = False) -> Optional[Dict[str, Any]]:
+        """Get product by ID
+        
+        Returns None for unknown or malformed IDs; query errors also return
+        None unless raise_errors is set.
+        """
+        if not ObjectId.is_valid(product_id):
+            return None
         try:
-            product = self.db.products.find_one({"_id": ObjectId(product_id)})
+            product = await self.db.products.find_one({"_id": ObjectId(product_id)})
             if product:
                 product["_id"] = str(product["_id"])
             return product
         except Exception as e:
             logger.error(f"Failed to get product {product_id}: {e}")
+            if raise_errors:
+                raise
             return None
 
-    def update_product(self, product_id: str, update_data: Dict[str, Any]) -> bool:
-        """Update product data"""
+    async def get_products_by_ids(self, product_ids: List[str], projection: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+        """Get several products in one query, keyed by product ID
+        
+        Only name, sku, price, image and price_version are loaded unless a
+        projection is given. Unknown or malformed IDs are left out of the result.
+        """
+        object_ids = set()
+        for product_id in product_ids:
+            try:
+                object_ids.add(ObjectId(product_id))
+            except Exception:
+                continue
+        
+        if not object_ids:
+            return {}
+        
+        try:
+            cursor = self.db.products.find(
+                {"_id": {"$in": list(object_ids)}},
+                projection or {"name": 1, "sku": 1, "price": 1, "image": 1, "price_version": 1}
+            )
+            products = {}
+            async for product in cursor:
+                product["_id"] = str(product["_id"])
+                products[product["_id"]] = product
+            return products
+        except Exception as e:
+            logger.error(f"Failed to get products by IDs: {e}")
+            return {}
+
+    async def update_product(self, product_id: str, update_data: Dict[str, Any]) -> bool:
+        """Update product data
+        
+        price_version is bumped when a field copied onto cart items changes,
+        so carts holding the product know to refresh their copy.
+        """
         update_data["updated_at"] = datetime.utcnow()
+        update = {"$set": update_data}
+        if any(field in update_data for field in CART_SNAPSHOT_FIELDS):
+            update["$inc"] = {"price_version": 1}
         
         try:
-            result = self.db.products.update_one(
+            before = await self.db.products.find_one_and_update(
                 {"_id": ObjectId(product_id)},
-                {"$set": update_data}
+                update,
+                projection={"stock_quantity": 1},
+                return_document=ReturnDocument.BEFORE
             )
-            return result.modified_count > 0
+            if before is None:
+                return False
+            
+            catalogue_cache.bump()
+            if "stock_quantity" in update_data:
+                await self._bump_stats(_counter_delta(
+                    _product_counters(before),
+                    _product_counters(update_data)
+                ))
+            return True
         except Exception as e:
             logger.error(f"Failed to update product {product_id}: {e}")
             return False
 
-    def delete_product(self, product_id: str) -> bool:
+    async def delete_product(self, product_id: str) -> bool:
         """Delete product"""
         try:
-            result = self.db.products.delete_one({"_id": ObjectId(product_id)})
-            return result.deleted_count > 0
+            deleted = await self.db.products.find_one_and_delete(
+                {"_id": ObjectId(product_id)},
+                projection={"stock_quantity": 1}
+            )
+            if deleted is None:
+                return False
+            
+            catalogue_cache.bump()
+            await self._bump_stats({
+                "total_products": -1,
+                **_counter_delta(_product_counters(deleted), _product_counters(None))
+            })
+            return True
         except Exception as e:
             logger.error(f"Failed to delete product {product_id}: {e}")
             return False
 
-    def get_products_count(self, category: Optional[str] = None, search: Optional[str] = None) -> int:
+    async def watch_product_changes(self, on_change: Callable[[Optional[str]], None], retry_seconds: float = 5.0):
+        """Report every change to the products collection
+        
+        Lets each worker drop cached catalogue data when another worker
+        writes a product. Updates that only move stock call
+        on_change(product_id); any other change calls on_change(None). Change
+        streams need a replica set; on a standalone server this logs a
+        warning and returns.
+        """
+        while True:
+            try:
+                async with self.db.products.watch() as stream:
+                    # Changes may have been missed while the stream was down
+                    on_change(None)
+                    async for change in stream:
+                        on_change(_stock_only_change(change))
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                # 40573: change streams are only supported on replica sets
+                if e.code == 40573:
+                    logger.warning("MongoDB does not support change streams, catalogue cache relies on its TTL")
+                    return
+                logger.error(f"Product change stream failed: {e}")
+            except Exception as e:
+                logger.error(f"Product change stream failed: {e}")
+            await asyncio.sleep(retry_seconds)
+
+    async def get_products_count(self, category: Optional[str] = None, search: Optional[str] = None) -> int:
         """Get total product count"""
         try:
-            query = {}
-            
-            if category:
-                query["category"] = category
-            
-            if search:
-                query["$or"] = [
-                    {"name": {"$regex": search, "$options": "i"}},
-                    {"sku": {"$regex": search, "$options": "i"}},
-                    {"description": {"$regex": search, "$options": "i"}},
-                    {"category": {"$regex": search, "$options": "i"}}
-                ]
-                
-            return self.db.products.count_documents(query)
+            use_text_index = bool(search) and self.text_search_enabled
+            query = self._build_product_query(category, search, use_text_index)
+            try:
+                return await self.db.products.count_documents(query)
+            except OperationFailure as e:
+                if not use_text_index:
+                    raise
+                self._disable_text_search(e)
+                return await self.get_products_count(category, search)
         except Exception as e:
             logger.error(f"Failed to get products count: {e}")
             return 0
 
     # Cart operations
-    def get_user_cart(self, user_id: str) -> Dict[str, Any]:
-        """Get user's cart"""
+    async def get_user_cart(self, user_id: str) -> Dict[str, Any]:
+        """Get user's cart
+        
+        Users without a stored cart get an empty one that is not written;
+        the document is created by the first item upsert.
+        """
         try:
-            cart = self.db.carts.find_one({"user_id": user_id})
+            cart = await self.db.carts.find_one({"user_id": user_id})
             if not cart:
-                # Create empty cart if it doesn't exist
-                cart_data = {
-                    "user_id": user_id,
-                    "items": [],
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                }
-                result = self.db.carts.insert_one(cart_data)
-                cart = self.db.carts.find_one({"_id": result.inserted_id})
+                return {"_id": None, "user_id": user_id, "items": []}
             
             # Convert ObjectId to string
             cart["_id"] = str(cart["_id"])
@@ -248,16 +895,79 @@ class DatabaseManager:
             logger.error(f"Failed to get cart for user {user_id}: {e}")
             return {"user_id": user_id, "items": []}
 
-    def update_user_cart(self, user_id: str, items: List[Dict[str, Any]]) -> bool:
+    async def get_repriced_products(self, items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Get the products of cart items that changed since the items were added
+        
+        One query matches each product only if its price_version is newer
+        than the version stamped on the item, so an unchanged cart costs a
+        single index lookup per item and returns nothing.
+        """
+        clauses = []
+        for item in items:
+            try:
+                product_id = ObjectId(item["product_id"])
+            except Exception:
+                continue
+            clauses.append({
+                "_id": product_id,
+                "price_version": {"$gt": item.get("product_version", 0)}
+            })
+        
+        if not clauses:
+            return {}
+        
+        try:
+            cursor = self.db.products.find(
+                {"$or": clauses},
+                {"name": 1, "sku": 1, "price": 1, "image": 1, "price_version": 1}
+            )
+            products = {}
+            async for product in cursor:
+                product["_id"] = str(product["_id"])
+                products[product["_id"]] = product
+            return products
+        except Exception as e:
+            logger.error(f"Failed to get repriced products: {e}")
+            return {}
+
+    async def save_cart_item_snapshots(self, user_id: str, items: List[Dict[str, Any]]) -> bool:
+        """Write refreshed product details onto existing cart items in one round trip
+        
+        Quantities are left alone, so concurrent quantity changes are kept.
+        """
+        if not items:
+            return True
+        
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"user_id": user_id, "items.product_id": item["product_id"]},
+                {"$set": {
+                    **{f"items.$.{field}": item[field] for field in (*CART_SNAPSHOT_FIELDS.values(), "product_version")},
+                    "updated_at": now
+                }}
+            )
+            for item in items
+        ]
+        try:
+            await self.db.carts.bulk_write(operations, ordered=False)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to save repriced cart for user {user_id}: {e}")
+            return False
+
+    async def update_user_cart(self, user_id: str, items: List[Dict[str, Any]]) -> bool:
         """Update user's cart"""
+        now = datetime.utcnow()
         try:
-            result = self.db.carts.update_one(
+            result = await self.db.carts.update_one(
                 {"user_id": user_id},
                 {
                     "$set": {
                         "items": items,
-                        "updated_at": datetime.utcnow()
-                    }
+                        "updated_at": now
+                    },
+                    "$setOnInsert": {"created_at": now}
                 },
                 upsert=True
             )
@@ -266,10 +976,11 @@ class DatabaseManager:
             logger.error(f"Failed to update cart for user {user_id}: {e}")
             return False
 
-    def clear_user_cart(self, user_id: str) -> bool:
+    async def clear_user_cart(self, user_id: str) -> bool:
         """Clear user's cart"""
         try:
-            result = self.db.carts.update_one(
+            # A user without a stored cart already has an empty one
+            await self.db.carts.update_one(
                 {"user_id": user_id},
                 {
                     "$set": {
@@ -278,37 +989,284 @@ class DatabaseManager:
                     }
                 }
             )
-            return result.modified_count > 0
+            return True
         except Exception as e:
             logger.error(f"Failed to clear cart for user {user_id}: {e}")
             return False
 
+    async def increment_cart_item(self, user_id: str, product_id: str, quantity: int) -> bool:
+        """Atomically add to the quantity of an item already in the cart
+        
+        Returns False when the product is not in the cart.
+        """
+        try:
+            result = await self.db.carts.update_one(
+                {"user_id": user_id, "items.product_id": product_id},
+                {
+                    "$inc": {"items.$.quantity": quantity},
+                    "$set": {"updated_at": datetime.utcnow()}
+                }
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Failed to increment cart item {product_id} for user {user_id}: {e}")
+            return False
+
+    async def push_cart_item(self, user_id: str, item: Dict[str, Any]) -> bool:
+        """Atomically append an item to the cart, creating the cart if needed
+        
+        If another request added the same product first, its quantity is
+        incremented instead so that neither update is lost. The upsert relies
+        on the unique carts.user_id index (see ensure_unique_cart_index).
+        """
+        now = datetime.utcnow()
+        try:
+            await self.db.carts.update_one(
+                {"user_id": user_id, "items.product_id": {"$ne": item["product_id"]}},
+                {
+                    "$push": {"items": item},
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"created_at": now}
+                },
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The cart exists and already holds this product
+            return await self.increment_cart_item(user_id, item["product_id"], item["quantity"])
+        except Exception as e:
+            logger.error(f"Failed to add cart item for user {user_id}: {e}")
+            return False
+
+    async def set_cart_item_quantity(self, user_id: str, product_id: str, quantity: int) -> bool:
+        """Atomically set the quantity of a cart item, removing it at zero
+        
+        Returns False when the product is not in the cart.
+        """
+        if quantity <= 0:
+            return await self.remove_cart_item(user_id, product_id)
+        
+        try:
+            result = await self.db.carts.update_one(
+                {"user_id": user_id, "items.product_id": product_id},
+                {
+                    "$set": {
+                        "items.$.quantity": quantity,
+                        "updated_at": datetime.utcnow()
+                    }
+                }
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Failed to set cart item {product_id} for user {user_id}: {e}")
+            return False
+
+    async def remove_cart_item(self, user_id: str, product_id: str) -> bool:
+        """Atomically remove an item from the cart
+        
+        Returns False when the product is not in the cart.
+        """
+        try:
+            result = await self.db.carts.update_one(
+                {"user_id": user_id, "items.product_id": product_id},
+                {
+                    "$pull": {"items": {"product_id": product_id}},
+                    "$set": {"updated_at": datetime.utcnow()}
+                }
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Failed to remove cart item {product_id} for user {user_id}: {e}")
+            return False
+
     # Order operations
-    def create_order(self, order_data: Dict[str, Any]) -> str:
+    async def next_order_number(self) -> str:
+        """Allocate the next ORD-{year}-{seq} order number"""
+        year = datetime.utcnow().year
+        key = f"order_number:{year}"
+        
+        # Numbers used to be derived from the order count; start above them
+        if year not in self._seeded_order_years:
+            await self.order_numbers.seed(key, await self.db.orders.count_documents({}))
+            self._seeded_order_years.add(year)
+        
+        seq = await self.order_numbers.next(key)
+        return f"ORD-{year}-{str(seq).zfill(4)}"
+
+    async def create_order(self, order_data: Dict[str, Any]) -> str:
         """Create a new order"""
         order_data["created_at"] = datetime.utcnow()
         order_data["updated_at"] = datetime.utcnow()
         
         # Generate order number if not provided
         if "order_number" not in order_data:
-            order_count = self.db.orders.count_documents({})
-            order_data["order_number"] = f"ORD-{datetime.utcnow().year}-{str(order_count + 1).zfill(4)}"
+            order_data["order_number"] = await self.next_order_number()
         
-        result = self.db.orders.insert_one(order_data)
+        result = await self.db.orders.insert_one(order_data)
+        await self._bump_stats({"total_orders": 1, **_order_counters(order_data)})
         logger.info(f"Order created with ID: {result.inserted_id}")
         return str(result.inserted_id)
 
-    def get_all_orders(self, skip: int = 0, limit: int = 100, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    async def get_idempotent_checkout(self, idempotency_key: str, request_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get the checkout recorded under an idempotency key
+        
+        Raises IdempotencyKeyReused if the key was recorded for a request
+        with a different hash.
+        """
+        try:
+            record = await self.db.idempotency_keys.find_one({"_id": idempotency_key})
+        except Exception as e:
+            logger.error(f"Failed to get idempotency key {idempotency_key}: {e}")
+            return None
+        recorded_hash = (record or {}).get("request_hash")
+        if request_hash and recorded_hash and recorded_hash != request_hash:
+            raise IdempotencyKeyReused("Idempotency-Key was already used for a different request")
+        return record
+
+    async def _get_duplicate_checkout(self, idempotency_key: Optional[str], order_data: Dict[str, Any], request_hash: Optional[str] = None) -> Optional[str]:
+        """Find the order that made a checkout fail with a duplicate key"""
+        if idempotency_key:
+            record = await self.get_idempotent_checkout(idempotency_key, request_hash)
+            if record:
+                return record["order_id"]
+        
+        # Payment IDs stay unique on orders after their idempotency key expires
+        payment_id = order_data.get("razorpay_payment_id")
+        if payment_id:
+            order = await self.db.orders.find_one({"razorpay_payment_id": payment_id}, {"_id": 1})
+            if order:
+                return str(order["_id"])
+        return None
+
+    async def checkout(self, order_data: Dict[str, Any], fabrication_status: Optional[int] = None, idempotency_key: Optional[str] = None, reservation_id: Optional[str] = None, request_hash: Optional[str] = None) -> str:
+        """Create an order and apply its side effects in one transaction
+        
+        The order insert, cart clear, optional fabrication_status update and
+        audit log entry either all commit or none do. with_transaction
+        retries the whole transaction on TransientTransactionError and the
+        commit on UnknownTransactionCommitResult. Standalone servers, which
+        have no transactions, get the same writes in sequence.
+        
+        With an idempotency key, or for an order carrying a
+        razorpay_payment_id, a checkout that was already made returns the
+        existing order ID instead of creating another order. request_hash
+        is stored with the key; a duplicate whose hash differs raises
+        IdempotencyKeyReused.
+        
+        A held stock reservation is committed with the order; if it was
+        already released, ReservationExpired is raised and nothing is written.
+        """
+        now = datetime.utcnow()
+        user_id = order_data["user_id"]
+        order_data["created_at"] = now
+        order_data["updated_at"] = now
+        if "order_number" not in order_data:
+            order_data["order_number"] = await self.next_order_number()
+        # Fixed up front so a retried transaction inserts the same order
+        order_data["_id"] = ObjectId()
+        order_id = str(order_data["_id"])
+        committed = {}
+        
+        async def write_all(session=None):
+            committed.clear()
+            # Claimed first so a concurrent duplicate fails before writing anything
+            if idempotency_key:
+                await self.db.idempotency_keys.insert_one({
+                    "_id": idempotency_key,
+                    "order_id": order_id,
+                    "user_id": user_id,
+                    "request_hash": request_hash,
+                    "created_at": now
+                }, session=session)
+            if reservation_id:
+                reservation = await self.db.stock_reservations.find_one_and_update(
+                    {"_id": ObjectId(reservation_id), "status": "held"},
+                    {"$set": {"status": "committed", "order_id": order_id, "updated_at": now}},
+                    session=session,
+                    return_document=ReturnDocument.AFTER
+                )
+                if reservation is None:
+                    raise ReservationExpired(f"Reservation {reservation_id} is no longer held")
+                committed["reservation"] = reservation
+            await self.db.orders.insert_one(order_data, session=session)
+            await self.db.carts.update_one(
+                {"user_id": user_id},
+                {"$set": {"items": [], "updated_at": now}},
+                session=session
+            )
+            if fabrication_status is not None:
+                await self.db.users.update_one(
+                    {"_id": ObjectId(user_id)},
+                    {"$set": {"fabrication_status": fabrication_status, "updated_at": now}},
+                    session=session
+                )
+            await self.db.audit_logs.insert_one({
+                "action": "order_created",
+                "order_id": order_id,
+                "order_number": order_data["order_number"],
+                "user_id": user_id,
+                "payment_method": order_data.get("payment_method"),
+                "total_amount": order_data.get("total"),
+                "created_at": now
+            }, session=session)
+        
+        try:
+            if self.transactions_enabled:
+                try:
+                    async with await self.client.start_session() as session:
+                        await session.with_transaction(write_all)
+                except OperationFailure as e:
+                    # IllegalOperation: transactions need a replica set or mongos
+                    if e.code != 20:
+                        raise
+                    logger.warning("MongoDB does not support transactions, checkout writes will not be atomic")
+                    self.transactions_enabled = False
+            
+            if not self.transactions_enabled:
+                try:
+                    await write_all()
+                except Exception:
+                    # Undo our own claims so a retry is not replayed to a missing order
+                    if idempotency_key:
+                        await self.db.idempotency_keys.delete_one({"_id": idempotency_key, "order_id": order_id})
+                    if committed:
+                        await self.db.stock_reservations.update_one(
+                            {"_id": ObjectId(reservation_id), "order_id": order_id},
+                            {"$set": {"status": "held"}, "$unset": {"order_id": ""}}
+                        )
+                    raise
+        except DuplicateKeyError:
+            existing_order_id = await self._get_duplicate_checkout(idempotency_key, order_data, request_hash)
+            if existing_order_id is None:
+                raise
+            if reservation_id:
+                # The original checkout holds its own stock
+                await self.release_reservation(reservation_id)
+            logger.info(f"Duplicate checkout for order {existing_order_id} ignored")
+            return existing_order_id
+        
+        # Kept out of the transaction: every checkout touches these hot documents
+        if committed:
+            await self._settle_reservation(committed["reservation"])
+        await self._bump_stats({"total_orders": 1, **_order_counters(order_data)})
+        if fabrication_status is not None:
+            principal_cache.invalidate_user_id(user_id)
+        
+        logger.info(f"Checkout created order {order_data['order_number']} with ID: {order_id}")
+        return order_id
+
+    async def get_all_orders(self, skip: int = 0, limit: int = 100, status: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all orders with pagination and optional status filter"""
         try:
             query = {}
             if status:
                 query["status"] = status
                 
-            orders = list(self.db.orders.find(query)
+            cursor = (self.db.orders.find(query)
                         .skip(skip)
                         .limit(limit)
                         .sort("created_at", -1))
+            orders = await cursor.to_list(length=None)
             
             # Convert ObjectId to string
             for order in orders:
@@ -319,10 +1277,26 @@ class DatabaseManager:
             logger.error(f"Failed to get orders: {e}")
             return []
 
-    def get_order_by_id(self, order_id: str) -> Optional[Dict[str, Any]]:
+    async def get_orders_page(self, skip: int = 0, limit: int = 100, status: Optional[str] = None, estimate_count: bool = False, cursor: Optional[str] = None, with_users: bool = False) -> Dict[str, Any]:
+        """Get a page of orders and the total count in one query"""
+        try:
+            query = {}
+            if status:
+                query["status"] = status
+            page = await self.paginate("orders", query, skip, limit, estimate_count=estimate_count, cursor=cursor)
+            if with_users:
+                await self.hydrate_users(page["items"])
+            return page
+        except InvalidCursor:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to get orders page: {e}")
+            return {"items": [], "total": 0, "next_cursor": None}
+
+    async def get_order_by_id(self, order_id: str) -> Optional[Dict[str, Any]]:
         """Get order by ID"""
         try:
-            order = self.db.orders.find_one({"_id": ObjectId(order_id)})
+            order = await self.db.orders.find_one({"_id": ObjectId(order_id)})
             if order:
                 order["_id"] = str(order["_id"])
             return order
@@ -330,12 +1304,12 @@ class DatabaseManager:
             logger.error(f"Failed to get order {order_id}: {e}")
             return None
 
-    def get_user_orders(self, user_id: str) -> List[Dict[str, Any]]:
+    async def get_user_orders(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all orders for a specific user"""
         try:
-            orders = list(self.db.orders.find(
+            orders = await self.db.orders.find(
                 {"user_id": user_id}
-            ).sort("created_at", -1))
+            ).sort("created_at", -1).to_list(length=None)
             
             # Convert ObjectId to string
             for order in orders:
@@ -346,48 +1320,255 @@ class DatabaseManager:
             logger.error(f"Failed to get orders for user {user_id}: {e}")
             return []
 
-    def update_order(self, order_id: str, update_data: Dict[str, Any]) -> bool:
+    async def get_user_orders_page(self, user_id: str, skip: int = 0, limit: int = 20, cursor: Optional[str] = None, status: Optional[str] = None, search: Optional[str] = None) -> Dict[str, Any]:
+        """Get a page of order summaries for a user, newest first
+        
+        search matches the order number, the order id and every item's
+        product name, not only the preview items. Query errors are raised
+        rather than returned as an empty history.
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        if status:
+            query["status"] = status
+        if search:
+            pattern = {"$regex": re.escape(search.strip()), "$options": "i"}
+            query["$or"] = [{"order_number": pattern}, {"items.product_name": pattern}]
+            if ObjectId.is_valid(search.strip()):
+                query["$or"].append({"_id": ObjectId(search.strip())})
+        return await self.paginate(
+            "orders",
+            query,
+            skip,
+            limit,
+            projection=ORDER_SUMMARY_PROJECTION,
+            cursor=cursor
+        )
+
+    async def get_user_order_summary(self, user_id: str) -> Dict[str, Any]:
+        """Totals across all of a user's orders for the order history header"""
+        pipeline = [
+            {"$match": {"user_id": user_id}},
+            {"$group": {
+                "_id": None,
+                "total_orders": {"$sum": 1},
+                "delivered_orders": {"$sum": {"$cond": [{"$eq": ["$status", "delivered"]}, 1, 0]}},
+                "pending_orders": {"$sum": {"$cond": [{"$in": ["$status", ["pending", "confirmed", "processing"]]}, 1, 0]}},
+                "total_spent": {"$sum": {"$ifNull": ["$total", 0]}}
+            }},
+            {"$project": {"_id": 0}}
+        ]
+        summaries = await self.db.orders.aggregate(pipeline).to_list(length=1)
+        if summaries:
+            return summaries[0]
+        return {"total_orders": 0, "delivered_orders": 0, "pending_orders": 0, "total_spent": 0}
+
+    async def update_order(self, order_id: str, update_data: Dict[str, Any]) -> bool:
         """Update order data"""
         update_data["updated_at"] = datetime.utcnow()
         
         try:
-            result = self.db.orders.update_one(
+            before = await self.db.orders.find_one_and_update(
                 {"_id": ObjectId(order_id)},
-                {"$set": update_data}
+                {"$set": update_data},
+                projection={"status": 1, "total": 1},
+                return_document=ReturnDocument.BEFORE
             )
-            return result.modified_count > 0
+            if before is None:
+                return False
+            
+            if "status" in update_data:
+                await self._bump_stats(_counter_delta(
+                    _order_counters(before),
+                    _order_counters({**before, **update_data})
+                ))
+            return True
         except Exception as e:
             logger.error(f"Failed to update order {order_id}: {e}")
             return False
 
-    def get_orders_count(self, status: Optional[str] = None) -> int:
+    async def get_orders_count(self, status: Optional[str] = None) -> int:
         """Get total order count"""
         try:
             query = {}
             if status:
                 query["status"] = status
-            return self.db.orders.count_documents(query)
+            return await self.db.orders.count_documents(query)
         except Exception as e:
             logger.error(f"Failed to get orders count: {e}")
             return 0
 
+    # Stock reservations
+    async def _move_stock(self, product_id: str, quantity: int, require_stock: bool) -> Optional[Dict[str, Any]]:
+        """Move stock into (or out of, if negative) reservation for one product
+        
+        With require_stock the update only matches while enough stock is
+        left, so concurrent reservations can never take it below zero;
+        products without a stock_quantity always match. Returns the
+        product's stock_quantity before the move, or None if nothing matched.
+        """
+        query = {"_id": ObjectId(product_id)}
+        if require_stock:
+            query["$or"] = [{"stock_quantity": {"$gte": quantity}}, {"stock_quantity": None}]
+        before = await self.db.products.find_one_and_update(
+            query,
+            _stock_move(quantity),
+            projection={"stock_quantity": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            return None
+        # Only this product's cached entries hold its stock
+        catalogue_cache.invalidate(product_id)
+        return before
+
+    async def _move_stock_lines(self, lines: Dict[str, int], require_stock: bool, sign: int = 1) -> Dict[str, bool]:
+        """Move stock for every line concurrently and keep the low stock counter in step"""
+        results = await asyncio.gather(
+            *(self._move_stock(product_id, sign * quantity, require_stock) for product_id, quantity in lines.items()),
+            return_exceptions=True
+        )
+        moved = {}
+        delta = {}
+        for (product_id, quantity), before in zip(lines.items(), results):
+            if isinstance(before, Exception):
+                logger.error(f"Failed to move stock for product {product_id}: {before}")
+                before = None
+            moved[product_id] = before is not None
+            stock = (before or {}).get("stock_quantity")
+            if stock is not None:
+                for key, value in _counter_delta(
+                    _product_counters({"stock_quantity": stock}),
+                    _product_counters({"stock_quantity": stock - sign * quantity})
+                ).items():
+                    delta[key] = delta.get(key, 0) + value
+        await self._bump_stats(delta)
+        return moved
+
+    async def reserve_stock(self, user_id: str, items: List[Dict[str, Any]], reference: Optional[str] = None, ttl_seconds: Optional[int] = None) -> str:
+        """Reserve stock for every line or none of them
+        
+        Each product is reserved with a conditional update that only matches
+        while enough stock is left, all lines in parallel. If any line fails
+        the others are put back and InsufficientStock lists the failed
+        products. The reservation is held until committed by checkout,
+        released, or swept up by release_expired_reservations.
+        """
+        lines: Dict[str, int] = {}
+        for item in items:
+            lines[item["product_id"]] = lines.get(item["product_id"], 0) + item["quantity"]
+        
+        # A non-positive line would pass the stock check and add stock back
+        invalid = {product_id for product_id in lines if not ObjectId.is_valid(product_id)}
+        invalid.update(item["product_id"] for item in items if item["quantity"] <= 0)
+        if invalid:
+            raise InsufficientStock(sorted(invalid))
+        
+        moved = await self._move_stock_lines(lines, require_stock=True)
+        failed = [product_id for product_id, ok in moved.items() if not ok]
+        if failed:
+            await self._move_stock_lines(
+                {product_id: lines[product_id] for product_id, ok in moved.items() if ok},
+                require_stock=False,
+                sign=-1
+            )
+            raise InsufficientStock(failed)
+        
+        now = datetime.utcnow()
+        reservation = {
+            "user_id": user_id,
+            "items": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in lines.items()],
+            "status": "held",
+            "reference": reference,
+            "expires_at": now + timedelta(seconds=ttl_seconds or RESERVATION_TTL_SECONDS),
+            "created_at": now,
+            "updated_at": now
+        }
+        try:
+            result = await self.db.stock_reservations.insert_one(reservation)
+        except Exception:
+            await self._move_stock_lines(lines, require_stock=False, sign=-1)
+            raise
+        return str(result.inserted_id)
+
+    async def get_held_reservation(self, user_id: str, reference: str) -> Optional[Dict[str, Any]]:
+        """Get the user's held reservation for a payment reference"""
+        try:
+            reservation = await self.db.stock_reservations.find_one(
+                {"user_id": user_id, "reference": reference, "status": "held"}
+            )
+            if reservation:
+                reservation["_id"] = str(reservation["_id"])
+            return reservation
+        except Exception as e:
+            logger.error(f"Failed to get reservation {reference}: {e}")
+            return None
+
+    async def _settle_reservation(self, reservation: Dict[str, Any]):
+        """Drop committed quantities from reserved_quantity in one round trip"""
+        operations = [
+            UpdateOne({"_id": ObjectId(item["product_id"])}, {"$inc": {"reserved_quantity": -item["quantity"]}})
+            for item in reservation["items"]
+        ]
+        try:
+            await self.db.products.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to settle reservation {reservation['_id']}: {e}")
+
+    async def release_reservation(self, reservation_id: str) -> bool:
+        """Return a held reservation's stock; False if it was not held"""
+        try:
+            reservation = await self.db.stock_reservations.find_one_and_update(
+                {"_id": ObjectId(reservation_id), "status": "held"},
+                {"$set": {"status": "released", "updated_at": datetime.utcnow()}}
+            )
+            if reservation is None:
+                return False
+            
+            lines = {item["product_id"]: item["quantity"] for item in reservation["items"]}
+            await self._move_stock_lines(lines, require_stock=False, sign=-1)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to release reservation {reservation_id}: {e}")
+            return False
+
+    async def release_user_reservations(self, user_id: str) -> int:
+        """Release the user's held reservations, e.g. when a new payment is started"""
+        cursor = self.db.stock_reservations.find({"user_id": user_id, "status": "held"}, {"_id": 1})
+        released = 0
+        async for reservation in cursor:
+            released += await self.release_reservation(str(reservation["_id"]))
+        return released
+
+    async def release_expired_reservations(self) -> int:
+        """Release held reservations whose payment never completed"""
+        cursor = self.db.stock_reservations.find(
+            {"status": "held", "expires_at": {"$lt": datetime.utcnow()}},
+            {"_id": 1}
+        )
+        released = 0
+        async for reservation in cursor:
+            released += await self.release_reservation(str(reservation["_id"]))
+        if released:
+            logger.info(f"Released {released} expired stock reservations")
+        return released
+
     # Project operations
-    def create_project(self, project_data: Dict[str, Any]) -> str:
+    async def create_project(self, project_data: Dict[str, Any]) -> str:
         """Create a new project"""
         project_data["created_at"] = datetime.utcnow()
         project_data["updated_at"] = datetime.utcnow()
         project_data["status"] = "pending"
         
-        result = self.db.projects.insert_one(project_data)
+        result = await self.db.projects.insert_one(project_data)
         logger.info(f"Project created with ID: {result.inserted_id}")
         return str(result.inserted_id)
     
-    def get_user_projects(self, user_id: str) -> List[Dict[str, Any]]:
+    async def get_user_projects(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all projects for a user"""
         try:
-            projects = list(self.db.projects.find(
+            projects = await self.db.projects.find(
                 {"user_id": user_id}
-            ).sort("created_at", -1))
+            ).sort("created_at", -1).to_list(length=None)
             
             # Convert ObjectId to string
             for project in projects:
@@ -398,10 +1579,10 @@ class DatabaseManager:
             logger.error(f"Failed to get projects for user {user_id}: {e}")
             return []
     
-    def update_project_status(self, project_id: str, status: str) -> bool:
+    async def update_project_status(self, project_id: str, status: str) -> bool:
         """Update project status"""
         try:
-            result = self.db.projects.update_one(
+            result = await self.db.projects.update_one(
                 {"_id": ObjectId(project_id)},
                 {"$set": {"status": status, "updated_at": datetime.utcnow()}}
             )
@@ -411,21 +1592,21 @@ class DatabaseManager:
             return False
     
     # Quote operations
-    def create_quote(self, quote_data: Dict[str, Any]) -> str:
+    async def create_quote(self, quote_data: Dict[str, Any]) -> str:
         """Create a new quote"""
         quote_data["created_at"] = datetime.utcnow()
         quote_data["status"] = "pending"
         
-        result = self.db.quotes.insert_one(quote_data)
+        result = await self.db.quotes.insert_one(quote_data)
         logger.info(f"Quote created with ID: {result.inserted_id}")
         return str(result.inserted_id)
     
-    def get_user_quotes(self, user_id: str) -> List[Dict[str, Any]]:
+    async def get_user_quotes(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all quotes for a user"""
         try:
-            quotes = list(self.db.quotes.find(
+            quotes = await self.db.quotes.find(
                 {"user_id": user_id}
-            ).sort("created_at", -1))
+            ).sort("created_at", -1).to_list(length=None)
             
             # Convert ObjectId to string
             for quote in quotes:
@@ -437,22 +1618,24 @@ class DatabaseManager:
             return []
     
     # Contact message operations
-    def create_contact_message(self, message_data: Dict[str, Any]) -> str:
+    async def create_contact_message(self, message_data: Dict[str, Any]) -> str:
         """Create a new contact message"""
         message_data["created_at"] = datetime.utcnow()
         message_data["status"] = "new"
         
-        result = self.db.contact_messages.insert_one(message_data)
+        result = await self.db.contact_messages.insert_one(message_data)
+        await self._bump_stats({"new_messages": 1})
         logger.info(f"Contact message created with ID: {result.inserted_id}")
         return str(result.inserted_id)
     
-    def get_contact_messages(self, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+    async def get_contact_messages(self, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
         """Get contact messages with pagination"""
         try:
-            messages = list(self.db.contact_messages.find()
-                        .skip(skip)
-                        .limit(limit)
-                        .sort("created_at", -1))
+            cursor = (self.db.contact_messages.find()
+                       .skip(skip)
+                       .limit(limit)
+                       .sort("created_at", -1))
+            messages = await cursor.to_list(length=None)
             
             # Convert ObjectId to string
             for message in messages:
@@ -463,16 +1646,26 @@ class DatabaseManager:
             logger.error(f"Failed to get contact messages: {e}")
             return []
 
-    def get_contact_messages_count(self) -> int:
+    async def get_contact_messages_page(self, skip: int = 0, limit: int = 50, estimate_count: bool = False, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get a page of contact messages and the total count in one query"""
+        try:
+            return await self.paginate("contact_messages", {}, skip, limit, estimate_count=estimate_count, cursor=cursor)
+        except InvalidCursor:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to get contact messages page: {e}")
+            return {"items": [], "total": 0, "next_cursor": None}
+
+    async def get_contact_messages_count(self) -> int:
         """Get total contact messages count"""
         try:
-            return self.db.contact_messages.count_documents({})
+            return await self.db.contact_messages.count_documents({})
         except Exception as e:
             logger.error(f"Failed to get contact messages count: {e}")
             return 0
     
     # Component operations
-    def search_components(self, query: str, category: Optional[str] = None) -> List[Dict[str, Any]]:
+    async def search_components(self, query: str, category: Optional[str] = None) -> List[Dict[str, Any]]:
         """Search components by part number or description"""
         try:
             search_filter = {
@@ -486,7 +1679,7 @@ class DatabaseManager:
             if category:
                 search_filter["category"] = category
             
-            components = list(self.db.components.find(search_filter).limit(50))
+            components = await self.db.components.find(search_filter).limit(50).to_list(length=None)
             
             # Convert ObjectId to string
             for component in components:
@@ -497,20 +1690,20 @@ class DatabaseManager:
             logger.error(f"Failed to search components: {e}")
             return []
     
-    def get_component_categories(self) -> List[str]:
+    async def get_component_categories(self) -> List[str]:
         """Get all component categories"""
         try:
-            return self.db.components.distinct("category")
+            return await self.db.components.distinct("category")
         except Exception as e:
             logger.error(f"Failed to get component categories: {e}")
             return []
     
     # Analytics operations
-    def get_user_stats(self) -> Dict[str, Any]:
+    async def get_user_stats(self) -> Dict[str, Any]:
         """Get user statistics"""
         try:
-            total_users = self.db.users.count_documents({})
-            active_users = self.db.users.count_documents({"is_active": True})
+            total_users = await self.db.users.count_documents({})
+            active_users = await self.db.users.count_documents({"is_active": True})
             
             return {
                 "total_users": total_users,
@@ -521,7 +1714,7 @@ class DatabaseManager:
             logger.error(f"Failed to get user stats: {e}")
             return {}
     
-    def get_project_stats(self) -> Dict[str, Any]:
+    async def get_project_stats(self) -> Dict[str, Any]:
         """Get project statistics"""
         try:
             pipeline = [
@@ -534,33 +1727,33 @@ class DatabaseManager:
                 }
             ]
             
-            stats = list(self.db.projects.aggregate(pipeline))
+            stats = await self.db.projects.aggregate(pipeline).to_list(length=None)
             return {stat["_id"]: {"count": stat["count"], "avg_value": stat.get("avg_value", 0)} for stat in stats}
         except Exception as e:
             logger.error(f"Failed to get project stats: {e}")
             return {}
 
-    def get_admin_stats(self) -> Dict[str, Any]:
+    async def get_admin_stats(self) -> Dict[str, Any]:
         """Get comprehensive admin statistics"""
         try:
             # Basic counts
-            total_users = self.db.users.count_documents({})
-            total_products = self.db.products.count_documents({})
-            total_orders = self.db.orders.count_documents({})
+            total_users = await self.db.users.count_documents({})
+            total_products = await self.db.products.count_documents({})
+            total_orders = await self.db.orders.count_documents({})
             
             # Revenue calculation
             revenue_pipeline = [
                 {"$match": {"status": {"$in": ["delivered", "completed"]}}},
                 {"$group": {"_id": None, "total_revenue": {"$sum": "$total"}}}
             ]
-            revenue_result = list(self.db.orders.aggregate(revenue_pipeline))
+            revenue_result = await self.db.orders.aggregate(revenue_pipeline).to_list(length=None)
             total_revenue = revenue_result[0]["total_revenue"] if revenue_result else 0.0
             
             # Pending orders
-            pending_orders = self.db.orders.count_documents({"status": "pending"})
+            pending_orders = await self.db.orders.count_documents({"status": "pending"})
             
             # Low stock products
-            low_stock_products = self.db.products.count_documents({
+            low_stock_products = await self.db.products.count_documents({
                 "$and": [
                     {"stock_quantity": {"$lt": 20}},
                     {"stock_quantity": {"$gt": 0}}
@@ -568,13 +1761,13 @@ class DatabaseManager:
             })
             
             # New messages
-            new_messages = self.db.contact_messages.count_documents({
+            new_messages = await self.db.contact_messages.count_documents({
                 "status": {"$in": ["new", "unread"]}
             })
             
             # New quotes (if collection exists)
             try:
-                new_quotes = self.db.quote_requests.count_documents({"status": "pending"})
+                new_quotes = await self.db.quote_requests.count_documents({"status": "pending"})
             except:
                 new_quotes = 0
             
@@ -593,18 +1786,24 @@ class DatabaseManager:
             return {}
 
     # Enquiry operations
-    def create_enquiry(self, enquiry_data: Dict[str, Any]) -> str:
+    async def create_enquiry(self, enquiry_data: Dict[str, Any]) -> str:
         """Create a new enquiry (design or product)"""
         enquiry_data["created_at"] = datetime.utcnow()
         enquiry_data["updated_at"] = datetime.utcnow()
         enquiry_data["status"] = "new"
         enquiry_data["replied"] = False
         
-        result = self.db.enquiries.insert_one(enquiry_data)
+        result = await self.db.enquiries.insert_one(enquiry_data)
+        await self._bump_stats({
+            "total_enquiries": 1,
+            "new_enquiries": 1,
+            "design_enquiries": 1 if enquiry_data.get("enquiry_type") == "design_enquiry" else 0,
+            "product_enquiries": 1 if enquiry_data.get("enquiry_type") == "product_enquiry" else 0
+        })
         logger.info(f"Enquiry created with ID: {result.inserted_id}")
         return str(result.inserted_id)
 
-    def get_all_enquiries(self, skip: int = 0, limit: int = 100, enquiry_type: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    async def get_all_enquiries(self, skip: int = 0, limit: int = 100, enquiry_type: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all enquiries with pagination and optional filters"""
         try:
             query = {}
@@ -613,10 +1812,11 @@ class DatabaseManager:
             if status:
                 query["status"] = status
                 
-            enquiries = list(self.db.enquiries.find(query)
+            cursor = (self.db.enquiries.find(query)
                             .skip(skip)
                             .limit(limit)
                             .sort("created_at", -1))
+            enquiries = await cursor.to_list(length=None)
             
             # Convert ObjectId to string
             for enquiry in enquiries:
@@ -627,10 +1827,28 @@ class DatabaseManager:
             logger.error(f"Failed to get enquiries: {e}")
             return []
 
-    def get_enquiry_by_id(self, enquiry_id: str) -> Optional[Dict[str, Any]]:
+    async def get_enquiries_page(self, skip: int = 0, limit: int = 100, enquiry_type: Optional[str] = None, status: Optional[str] = None, estimate_count: bool = False, cursor: Optional[str] = None, with_users: bool = False) -> Dict[str, Any]:
+        """Get a page of enquiries and the total count in one query"""
+        try:
+            query = {}
+            if enquiry_type:
+                query["enquiry_type"] = enquiry_type
+            if status:
+                query["status"] = status
+            page = await self.paginate("enquiries", query, skip, limit, estimate_count=estimate_count, cursor=cursor)
+            if with_users:
+                await self.hydrate_users(page["items"])
+            return page
+        except InvalidCursor:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to get enquiries page: {e}")
+            return {"items": [], "total": 0, "next_cursor": None}
+
+    async def get_enquiry_by_id(self, enquiry_id: str) -> Optional[Dict[str, Any]]:
         """Get enquiry by ID"""
         try:
-            enquiry = self.db.enquiries.find_one({"_id": ObjectId(enquiry_id)})
+            enquiry = await self.db.enquiries.find_one({"_id": ObjectId(enquiry_id)})
             if enquiry:
                 enquiry["_id"] = str(enquiry["_id"])
             return enquiry
@@ -638,21 +1856,31 @@ class DatabaseManager:
             logger.error(f"Failed to get enquiry {enquiry_id}: {e}")
             return None
 
-    def update_enquiry(self, enquiry_id: str, update_data: Dict[str, Any]) -> bool:
+    async def update_enquiry(self, enquiry_id: str, update_data: Dict[str, Any]) -> bool:
         """Update enquiry data"""
         update_data["updated_at"] = datetime.utcnow()
         
         try:
-            result = self.db.enquiries.update_one(
+            before = await self.db.enquiries.find_one_and_update(
                 {"_id": ObjectId(enquiry_id)},
-                {"$set": update_data}
+                {"$set": update_data},
+                projection={"status": 1},
+                return_document=ReturnDocument.BEFORE
             )
-            return result.modified_count > 0
+            if before is None:
+                return False
+            
+            if "status" in update_data:
+                await self._bump_stats(_counter_delta(
+                    _enquiry_counters(before),
+                    _enquiry_counters(update_data)
+                ))
+            return True
         except Exception as e:
             logger.error(f"Failed to update enquiry {enquiry_id}: {e}")
             return False
 
-    def get_enquiries_count(self, enquiry_type: Optional[str] = None, status: Optional[str] = None) -> int:
+    async def get_enquiries_count(self, enquiry_type: Optional[str] = None, status: Optional[str] = None) -> int:
         """Get total enquiries count"""
         try:
             query = {}
@@ -660,16 +1888,16 @@ class DatabaseManager:
                 query["enquiry_type"] = enquiry_type
             if status:
                 query["status"] = status
-            return self.db.enquiries.count_documents(query)
+            return await self.db.enquiries.count_documents(query)
         except Exception as e:
             logger.error(f"Failed to get enquiries count: {e}")
             return 0
 
-    def add_enquiry_reply(self, enquiry_id: str, reply_data: Dict[str, Any]) -> bool:
+    async def add_enquiry_reply(self, enquiry_id: str, reply_data: Dict[str, Any]) -> bool:
         """Add reply to an enquiry"""
         try:
             reply_data["timestamp"] = datetime.utcnow()
-            result = self.db.enquiries.update_one(
+            before = await self.db.enquiries.find_one_and_update(
                 {"_id": ObjectId(enquiry_id)},
                 {
                     "$push": {"replies": reply_data},
@@ -678,19 +1906,28 @@ class DatabaseManager:
                         "status": "replied",
                         "updated_at": datetime.utcnow()
                     }
-                }
+                },
+                projection={"status": 1},
+                return_document=ReturnDocument.BEFORE
             )
-            return result.modified_count > 0
+            if before is None:
+                return False
+            
+            await self._bump_stats(_counter_delta(
+                _enquiry_counters(before),
+                _enquiry_counters({"status": "replied"})
+            ))
+            return True
         except Exception as e:
             logger.error(f"Failed to add reply to enquiry {enquiry_id}: {e}")
             return False
 
-    def get_user_enquiries(self, user_id: str) -> List[Dict[str, Any]]:
+    async def get_user_enquiries(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all enquiries for a specific user"""
         try:
-            enquiries = list(self.db.enquiries.find(
+            enquiries = await self.db.enquiries.find(
                 {"user_id": user_id}
-            ).sort("created_at", -1))
+            ).sort("created_at", -1).to_list(length=None)
             
             # Convert ObjectId to string
             for enquiry in enquiries:
@@ -704,36 +1941,35 @@ class DatabaseManager:
 
     # Add these methods to your DatabaseManager class in database.py
 
-def create_order_with_payment(self, order_data: Dict[str, Any]) -> str:
+async def create_order_with_payment(self, order_data: Dict[str, Any]) -> str:
     """Create order with payment details"""
     order_data["created_at"] = datetime.utcnow()
     order_data["updated_at"] = datetime.utcnow()
     
     # Generate order number if not provided
     if "order_number" not in order_data:
-        order_count = self.db.orders.count_documents({})
-        order_data["order_number"] = f"ORD-{datetime.utcnow().year}-{str(order_count + 1).zfill(4)}"
+        order_data["order_number"] = await self.next_order_number()
     
     # Add payment tracking fields
     order_data["payment_verified"] = True
     order_data["payment_gateway"] = "razorpay"
     
-    result = self.db.orders.insert_one(order_data)
+    result = await self.db.orders.insert_one(order_data)
     logger.info(f"Order with payment created with ID: {result.inserted_id}")
     return str(result.inserted_id)
 
-def create_payment_log(self, payment_data: Dict[str, Any]) -> str:
+async def create_payment_log(self, payment_data: Dict[str, Any]) -> str:
     """Log payment attempt for tracking"""
     payment_data["created_at"] = datetime.utcnow()
     payment_data["status"] = "initiated"
     
-    result = self.db.payment_logs.insert_one(payment_data)
+    result = await self.db.payment_logs.insert_one(payment_data)
     return str(result.inserted_id)
 
-def update_payment_log(self, payment_id: str, update_data: Dict[str, Any]) -> bool:
+async def update_payment_log(self, payment_id: str, update_data: Dict[str, Any]) -> bool:
     """Update payment log status"""
     try:
-        result = self.db.payment_logs.update_one(
+        result = await self.db.payment_logs.update_one(
             {"razorpay_payment_id": payment_id},
             {"$set": {**update_data, "updated_at": datetime.utcnow()}}
         )
@@ -742,11 +1978,11 @@ def update_payment_log(self, payment_id: str, update_data: Dict[str, Any]) -> bo
         logger.error(f"Failed to update payment log: {e}")
         return False
 
-def get_payment_logs(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+async def get_payment_logs(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
     """Get payment logs"""
     try:
         query = {"user_id": user_id} if user_id else {}
-        logs = list(self.db.payment_logs.find(query).sort("created_at", -1))
+        logs = await self.db.payment_logs.find(query).sort("created_at", -1).to_list(length=None)
         
         for log in logs:
             log["_id"] = str(log["_id"])
@@ -756,12 +1992,12 @@ def get_payment_logs(self, user_id: Optional[str] = None) -> List[Dict[str, Any]
         logger.error(f"Failed to get payment logs: {e}")
         return []
 
-def get_failed_payments(self) -> List[Dict[str, Any]]:
+async def get_failed_payments(self) -> List[Dict[str, Any]]:
     """Get failed payment attempts for admin review"""
     try:
-        failed_payments = list(self.db.payment_logs.find({
+        failed_payments = await self.db.payment_logs.find({
             "status": {"$in": ["failed", "error"]}
-        }).sort("created_at", -1))
+        }).sort("created_at", -1).to_list(length=None)
         
         for payment in failed_payments:
             payment["_id"] = str(payment["_id"])
@@ -772,7 +2008,7 @@ def get_failed_payments(self) -> List[Dict[str, Any]]:
         return []
 
 # Enhanced order creation with better payment tracking
-def create_order_enhanced(self, order_data: Dict[str, Any]) -> str:
+async def create_order_enhanced(self, order_data: Dict[str, Any]) -> str:
     """Enhanced order creation with payment validation"""
     try:
         # Validate required payment fields
@@ -792,7 +2028,7 @@ def create_order_enhanced(self, order_data: Dict[str, Any]) -> str:
         order_data["validated"] = True
         order_data["payment_verified"] = order_data.get("payment_status") == "completed"
         
-        result = self.db.orders.insert_one(order_data)
+        result = await self.db.orders.insert_one(order_data)
         
         # Create audit log
         audit_log = {
@@ -803,7 +2039,7 @@ def create_order_enhanced(self, order_data: Dict[str, Any]) -> str:
             "total_amount": order_data.get("total"),
             "created_at": datetime.utcnow()
         }
-        self.db.audit_logs.insert_one(audit_log)
+        await self.db.audit_logs.insert_one(audit_log)
         
         logger.info(f"Enhanced order created with ID: {result.inserted_id}")
         return str(result.inserted_id)
@@ -812,15 +2048,15 @@ def create_order_enhanced(self, order_data: Dict[str, Any]) -> str:
         logger.error(f"Failed to create enhanced order: {e}")
         raise
 
-def get_order_with_payment_details(self, order_id: str) -> Optional[Dict[str, Any]]:
+async def get_order_with_payment_details(self, order_id: str) -> Optional[Dict[str, Any]]:
     """Get order with complete payment details"""
     try:
-        order = self.db.orders.find_one({"_id": ObjectId(order_id)})
+        order = await self.db.orders.find_one({"_id": ObjectId(order_id)})
         if order:
             order["_id"] = str(order["_id"])
             
             # Get related payment logs if available
-            payment_logs = self.get_payment_logs(order.get("user_id"))
+            payment_logs = await self.get_payment_logs(order.get("user_id"))
             order["payment_logs"] = payment_logs
             
         return order
@@ -1,21 +1,36 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Query
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Header, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, EmailStr, Field, create_model
 from passlib.context import CryptContext
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 import os
+import json
+import calendar
+from functools import lru_cache
+import asyncio
+import logging
 import razorpay
 from typing import List, Dict, Any
-from typing import Optional, List, Dict, Any
-from database import get_database
+from typing import Optional, List, Dict, Any, Tuple, Type
+from database import get_database, InvalidCursor, InsufficientStock, ReservationExpired, IdempotencyKeyReused, cart_item_snapshot
+from services.principal_cache import principal_cache
+from services.password_hasher import password_hasher, HashingPoolBusy
+from services.cart_store import CartStore
+from services.catalogue_cache import catalogue_cache
+from services.serialization_cache import SerializationCache
+from services.compression import CompressionMiddleware, PrecompressedCache, encoded_etag, precompressed_response, supported_encodings
 import razorpay
 import hashlib
 import hmac
 from datetime import datetime, timedelta
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Glonix Electronics API")
 
 # CORS middleware for frontend communication
@@ -32,8 +47,25 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+
+# Compressed forms of cached catalogue responses
+precompressed_cache = PrecompressedCache()
 
 db_manager = get_database()
+cart_store = CartStore(db_manager)
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(InsufficientStock)
+async def insufficient_stock_handler(request, exc: InsufficientStock):
+    return JSONResponse(status_code=409, content={"detail": str(exc), "product_ids": exc.product_ids})
+
+@app.exception_handler(IdempotencyKeyReused)
+async def idempotency_key_reused_handler(request, exc: IdempotencyKeyReused):
+    return JSONResponse(status_code=422, content={"detail": str(exc)})
 
 # Security
 SECRET_KEY = "SECRET_KEY"
@@ -47,6 +79,8 @@ razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
+ADMIN_STATS_RECONCILE_SECONDS = int(os.getenv("ADMIN_STATS_RECONCILE_SECONDS", "300"))
+RESERVATION_SWEEP_SECONDS = int(os.getenv("RESERVATION_SWEEP_SECONDS", "60"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
@@ -166,6 +200,179 @@ class ProductResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+# Response values for documents that predate a field
+PRODUCT_FIELD_DEFAULTS = {
+    "image": "",
+    "images": [],
+    "long_description": None,
+    "inStock": True,
+    "stock_quantity": 0,
+    "rating": 0.0,
+    "reviews": 0,
+    "specifications": {},
+    "features": [],
+    "applications": []
+}
+
+# Named field sets for ?fields=
+PRODUCT_FIELD_PRESETS = {
+    "card": ("id", "name", "sku", "price", "image", "inStock"),
+    "detail": tuple(ProductResponse.model_fields)
+}
+
+def product_values(product: Dict[str, Any], fields) -> Dict[str, Any]:
+    values = {}
+    for field in fields:
+        key = "_id" if field == "id" else field
+        if field in PRODUCT_FIELD_DEFAULTS:
+            values[field] = product.get(key, PRODUCT_FIELD_DEFAULTS[field])
+        else:
+            values[field] = product[key]
+    return values
+
+def product_response(product: Dict[str, Any]) -> ProductResponse:
+    return ProductResponse(**product_values(product, ProductResponse.model_fields))
+
+def parse_product_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Resolve a fields= value of field names and presets; None means every field"""
+    if not fields:
+        return None
+    
+    selected = set()
+    for name in fields.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name in PRODUCT_FIELD_PRESETS:
+            selected.update(PRODUCT_FIELD_PRESETS[name])
+        elif name in ProductResponse.model_fields:
+            selected.add(name)
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown product field: {name}")
+    
+    if not selected or selected == set(ProductResponse.model_fields):
+        return None
+    return tuple(field for field in ProductResponse.model_fields if field in selected)
+
+def product_projection(fields: Optional[Tuple[str, ...]]) -> Optional[Dict[str, int]]:
+    if fields is None:
+        return None
+    projection = {"_id" if field == "id" else field: 1 for field in fields}
+    # Needed for page cursors, ETags and the JSON cache key
+    projection.update(created_at=1, updated_at=1)
+    return projection
+
+@lru_cache(maxsize=128)
+def product_fields_model(fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """ProductResponse trimmed to the given fields"""
+    return create_model(
+        "ProductFieldsResponse",
+        **{field: (ProductResponse.model_fields[field].annotation, ProductResponse.model_fields[field]) for field in fields}
+    )
+
+# JSON for each product, reused until the product's updated_at changes
+product_json_cache = SerializationCache(
+    lambda product: product_response(product).model_dump_json().encode()
+)
+
+def product_json(product: Dict[str, Any], fields: Optional[Tuple[str, ...]] = None) -> bytes:
+    if fields is None:
+        return product_json_cache.get(product["_id"], product["updated_at"], product)
+    return product_json_cache.get(
+        (product["_id"], fields),
+        product["updated_at"],
+        product,
+        lambda product: product_fields_model(fields)(**product_values(product, fields)).model_dump_json().encode()
+    )
+
+# Cache-Control sent by each group of catalogue routes
+CACHE_CONTROL = {
+    "catalogue": os.getenv("CATALOGUE_CACHE_CONTROL", "public, max-age=0, must-revalidate"),
+    "admin": os.getenv("ADMIN_CACHE_CONTROL", "private, no-cache"),
+}
+
+def _http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def product_validators(product: Dict[str, Any]) -> Dict[str, Any]:
+    """ETag and Last-Modified of a product, from its updated_at"""
+    updated_at = product["updated_at"]
+    version = calendar.timegm(updated_at.utctimetuple()) * 1000 + updated_at.microsecond // 1000
+    return {"etag": f'"{product["_id"]}-{version}"', "last_modified": updated_at}
+
+def page_validators(page: Dict[str, Any]) -> Dict[str, Any]:
+    """ETag and Last-Modified of a product page
+    
+    The ETag covers each product's ID and updated_at plus the page totals,
+    so it changes whenever the response body would.
+    """
+    digest = hashlib.sha1(json.dumps(
+        [page["total"], page["next_cursor"], [(product["_id"], product["updated_at"]) for product in page["items"]]],
+        default=str
+    ).encode()).hexdigest()
+    updated = [product["updated_at"] for product in page["items"] if product.get("updated_at")]
+    return {"etag": f'"{digest}"', "last_modified": max(updated) if updated else None}
+
+def validator_headers(group: str, validators: Dict[str, Any]) -> Dict[str, str]:
+    headers = {"ETag": validators["etag"], "Cache-Control": CACHE_CONTROL[group]}
+    if validators["last_modified"]:
+        headers["Last-Modified"] = _http_date(validators["last_modified"])
+    return headers
+
+def matching_etag(request: Request, etag: str) -> Optional[str]:
+    """The If-None-Match tag that names a representation of etag, if any
+    
+    Compressed bodies carry the ETag with an encoding suffix, so any of
+    those variants matches too.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    variants = {etag, *(encoded_etag(etag, encoding) for encoding in supported_encodings())}
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag in variants:
+            return tag
+    return None
+
+def not_modified(request: Request, validators: Dict[str, Any], use_last_modified: bool = True) -> bool:
+    """Whether the client's cached copy is still current
+    
+    If-None-Match wins over If-Modified-Since when both are sent.
+    """
+    if request.headers.get("if-none-match") is not None:
+        return matching_etag(request, validators["etag"]) is not None
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if use_last_modified and if_modified_since and validators["last_modified"]:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return validators["last_modified"].replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+def not_modified_response(request: Request, headers: Dict[str, str]) -> Response:
+    """304 carrying the ETag of the representation the client holds"""
+    headers = {**headers, "Vary": "Accept-Encoding"}
+    headers["ETag"] = matching_etag(request, headers["ETag"]) or headers["ETag"]
+    return Response(status_code=304, headers=headers)
+
+def products_page_body(page: Dict[str, Any], skip: int, limit: int, fields: Optional[Tuple[str, ...]] = None) -> bytes:
+    """Assemble a product list body from cached per-product JSON"""
+    meta = json.dumps({
+        "total": page["total"],
+        "skip": skip,
+        "limit": limit,
+        "next_cursor": page["next_cursor"]
+    }, separators=(",", ":"))
+    return b'{"products":[' + b",".join(product_json(product, fields) for product in page["items"]) + b"]," + meta[1:].encode()
+
+def products_page_response(page: Dict[str, Any], skip: int, limit: int, headers: Optional[Dict[str, str]] = None, fields: Optional[Tuple[str, ...]] = None) -> Response:
+    return Response(content=products_page_body(page, skip, limit, fields), media_type="application/json", headers=headers)
+
 # Order Models
 class OrderUpdate(BaseModel):
     status: Optional[str] = None
@@ -202,7 +409,7 @@ class OrderItemModel(BaseModel):
     product_name: str
     product_sku: str
     price: float
-    quantity: int
+    quantity: int = Field(gt=0)
     total: float
 
 class OrderCreate(BaseModel):
@@ -219,11 +426,15 @@ class OrderCreate(BaseModel):
 # Cart Models
 class CartItem(BaseModel):
     product_id: str
-    quantity: int
+    quantity: int = Field(gt=0)
 
 class CartUpdate(BaseModel):
     items: List[CartItem]
 
+class CartItemQuantity(BaseModel):
+    # 0 removes the item
+    quantity: int = Field(ge=0)
+
 # Enquiry Models
 class EnquiryCreate(BaseModel):
     enquiry_type: str  # "design_enquiry" or "product_enquiry"
@@ -333,7 +544,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def hashing_busy_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many authentication requests, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -347,28 +565,119 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     except JWTError:
         raise credentials_exception
     
-    user = db_manager.get_user_by_email(email)
+    # Serve repeat requests for the same principal without a database read
+    user = principal_cache.get(email)
+    if user is not None:
+        return user
+    
+    user = await db_manager.get_user_by_email(email)
     if user is None:
         raise credentials_exception
+    principal_cache.set(email, user)
     return user
 
+async def build_order_items(items: List[OrderItemModel]) -> List[Dict[str, Any]]:
+    """Convert order items, taking product names and SKUs from the catalogue"""
+    products = await db_manager.get_products_by_ids([item.product_id for item in items])
+    
+    order_items = []
+    for item in items:
+        order_item = item.dict()
+        product = products.get(item.product_id)
+        if product:
+            order_item["product_name"] = product["name"]
+            order_item["product_sku"] = product["sku"]
+        order_items.append(order_item)
+    return order_items
+
+def checkout_idempotency_key(user_id: str, header_key: Optional[str], payment_id: Optional[str] = None) -> Optional[str]:
+    """Scope a client Idempotency-Key to the user, falling back to the Razorpay payment ID"""
+    if header_key:
+        return f"user:{user_id}:{header_key}"
+    if payment_id:
+        return f"razorpay:{payment_id}"
+    return None
+
+def checkout_request_hash(payload: BaseModel) -> str:
+    """Fingerprint of a checkout body, stored with its idempotency key"""
+    body = json.dumps(payload.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+def checkout_response(order_id: str) -> Dict[str, Any]:
+    return {"success": True, "order_id": order_id, "message": "Order created successfully"}
+
+def reservation_lines(items: List[Dict[str, Any]]) -> Dict[str, int]:
+    lines: Dict[str, int] = {}
+    for item in items:
+        lines[item["product_id"]] = lines.get(item["product_id"], 0) + item["quantity"]
+    return lines
+
+async def reserve_cart_for_payment(user_id: str, razorpay_order_id: str):
+    """Hold stock for the cart while the customer pays
+    
+    Earlier holds of the user are released first; an abandoned payment's
+    hold lapses after RESERVATION_TTL_SECONDS.
+    """
+    await db_manager.release_user_reservations(user_id)
+    cart = await cart_store.get(user_id)
+    if cart["items"]:
+        await db_manager.reserve_stock(user_id, cart["items"], reference=razorpay_order_id)
+
+async def place_order(user_id: str, order_data: Dict[str, Any], reservation_id: Optional[str] = None, **checkout_args) -> str:
+    """Reserve stock for the order unless already held, then run checkout
+    
+    Raises InsufficientStock if the items cannot be reserved. A hold that
+    expired before checkout is taken again once.
+    """
+    for attempt in range(2):
+        if reservation_id is None:
+            reservation_id = await db_manager.reserve_stock(user_id, order_data["items"])
+        try:
+            await cart_store.flush(user_id)
+            order_id = await db_manager.checkout(order_data, reservation_id=reservation_id, **checkout_args)
+            break
+        except ReservationExpired:
+            reservation_id = None
+            if attempt:
+                raise
+        except Exception:
+            await db_manager.release_reservation(reservation_id)
+            raise
+    
+    cart_store.discard(user_id)
+    return order_id
+
+async def replay_checkout(idempotency_key: Optional[str], user_id: str, request_hash: str) -> Optional[Dict[str, Any]]:
+    """Return the original response if this checkout was already made
+    
+    Raises IdempotencyKeyReused (422) if the key came with a different body.
+    """
+    if not idempotency_key:
+        return None
+    record = await db_manager.get_idempotent_checkout(idempotency_key, request_hash)
+    if not record:
+        return None
+    if record["user_id"] != user_id:
+        raise HTTPException(status_code=409, detail="Checkout already made by another user")
+    return checkout_response(record["order_id"])
+
 # Initialize admin user
-def initialize_admin():
+async def initialize_admin():
     """Create default admin user if it doesn't exist"""
     admin_email = "admin@glonix.com"
-    admin_user = db_manager.get_user_by_email(admin_email)
+    admin_user = await db_manager.get_user_by_email(admin_email)
     
     if not admin_user:
         admin_data = {
             "email": admin_email,
-            "hashed_password": get_password_hash("admin123"),
+            "hashed_password": await password_hasher.hash("admin123"),
             "full_name": "Admin User",
             "company": "Glonix Electronics",
             "phone": "+1-555-0100",
             "role": "admin",
             "fabrication_status": 0,
         }
-        db_manager.create_user(admin_data)
+        await db_manager.create_user(admin_data)
         print(f"Admin user created: {admin_email} / admin123")
 
 # Admin check decorator
@@ -377,23 +686,52 @@ def admin_required(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
+async def reconcile_admin_stats_periodically():
+    """Recount the materialized dashboard counters to correct any drift"""
+    while True:
+        await asyncio.sleep(ADMIN_STATS_RECONCILE_SECONDS)
+        try:
+            await db_manager.reconcile_admin_stats()
+        except Exception as e:
+            logger.error(f"Admin stats reconciliation failed: {e}")
+
+async def release_expired_reservations_periodically():
+    """Return stock held for payments that were never completed"""
+    while True:
+        await asyncio.sleep(RESERVATION_SWEEP_SECONDS)
+        try:
+            await db_manager.release_expired_reservations()
+        except Exception as e:
+            logger.error(f"Releasing expired reservations failed: {e}")
+
+background_tasks = []
+
 # Initialize admin on startup
 @app.on_event("startup")
 async def startup_event():
-    initialize_admin()
+    await db_manager.ping()
+    await db_manager.ensure_indexes()
+    await initialize_admin()
+    await db_manager.reconcile_admin_stats()
+    background_tasks.append(asyncio.create_task(reconcile_admin_stats_periodically()))
+    background_tasks.append(asyncio.create_task(release_expired_reservations_periodically()))
+    background_tasks.append(asyncio.create_task(db_manager.watch_product_changes(catalogue_cache.invalidate)))
 
 # API Routes
 @app.post("/auth/register", response_model=Token)
 async def register(user: UserCreate):
     # Check if user already exists
-    if db_manager.get_user_by_email(user.email):
+    if await db_manager.get_user_by_email(user.email):
         raise HTTPException(
             status_code=400,
             detail="Email already registered"
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except HashingPoolBusy:
+        raise hashing_busy_exception()
     user_data = {
         "email": user.email,
         "hashed_password": hashed_password,
@@ -404,7 +742,7 @@ async def register(user: UserCreate):
         "fabrication_status": 0,
     }
     
-    user_id = db_manager.create_user(user_data)
+    user_id = await db_manager.create_user(user_data)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -417,8 +755,15 @@ async def register(user: UserCreate):
 @app.post("/auth/login", response_model=Token)
 async def login(user: UserLogin):
     # Authenticate user
-    db_user = db_manager.get_user_by_email(user.email)
-    if not db_user or not verify_password(user.password, db_user["hashed_password"]):
+    db_user = await db_manager.get_user_by_email(user.email)
+    try:
+        password_valid = db_user is not None and await password_hasher.verify(
+            user.password, db_user["hashed_password"]
+        )
+    except HashingPoolBusy:
+        raise hashing_busy_exception()
+    
+    if not password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -460,78 +805,91 @@ async def verify_token(current_user: dict = Depends(get_current_user)):
 # PUBLIC PRODUCT ENDPOINTS (for customers)
 @app.get("/products", response_model=Dict[str, Any])
 async def get_products_public(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     category: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma separated product fields or presets: card, detail")
 ):
-    """Get products for public/customer view"""
-    products = db_manager.get_all_products(skip, limit, category, search)
-    total = db_manager.get_products_count(category, search)
-    
-    product_responses = []
-    for product in products:
-        product_responses.append(ProductResponse(
-            id=product["_id"],
-            name=product["name"],
-            sku=product["sku"],
-            category=product["category"],
-            price=product["price"],
-            image=product.get("image", ""),
-            images=product.get("images", []),
-            description=product["description"],
-            long_description=product.get("long_description"),
-            inStock=product.get("inStock", True),
-            stock_quantity=product.get("stock_quantity", 0),
-            rating=product.get("rating", 0.0),
-            reviews=product.get("reviews", 0),
-            specifications=product.get("specifications", {}),
-            features=product.get("features", []),
-            applications=product.get("applications", []),
-            created_at=product["created_at"],
-            updated_at=product["updated_at"]
-        ))
+    """Get products for public/customer view
     
-    return {
-        "products": product_responses,
-        "total": total,
-        "skip": skip,
-        "limit": limit
-    }
+    Pages carry an ETag; a matching If-None-Match on a cached page is
+    answered with 304 without touching the database or serializing.
+    """
+    selected_fields = parse_product_fields(fields)
+    
+    async def load_page():
+        page = await db_manager.get_products_page(
+            skip, limit, category, search,
+            estimate_count=True,
+            cursor=cursor,
+            projection=product_projection(selected_fields),
+            raise_errors=True
+        )
+        page["validators"] = page_validators(page)
+        return page
+    
+    # Failed loads raise instead of caching an empty catalogue
+    try:
+        page = await catalogue_cache.get_or_load(
+            ("products", skip, limit, category, search, cursor, selected_fields),
+            load_page,
+            tags=lambda page: (product["_id"] for product in page["items"])
+        )
+    except InvalidCursor:
+        raise
+    except Exception as e:
+        print(f"Get products error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve products")
+    headers = validator_headers("catalogue", page["validators"])
+    # Deleted products don't move a page's Last-Modified, so only the ETag is trusted
+    if not_modified(request, page["validators"], use_last_modified=False):
+        return not_modified_response(request, headers)
+    return precompressed_response(
+        request,
+        precompressed_cache,
+        (request.url.path, request.url.query, page["validators"]["etag"]),
+        lambda: products_page_body(page, skip, limit, selected_fields),
+        headers
+    )
 
 @app.get("/products/{product_id}")
-async def get_product_public(product_id: str):
+async def get_product_public(product_id: str, request: Request):
     """Get single product for public view"""
-    product = db_manager.get_product_by_id(product_id)
+    try:
+        product = await catalogue_cache.get_or_load(
+            ("product", product_id),
+            lambda: db_manager.get_product_by_id(product_id, raise_errors=True),
+            tags=lambda product: (product_id,)
+        )
+    except Exception as e:
+        print(f"Get product error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve product")
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return ProductResponse(
-        id=product["_id"],
-        name=product["name"],
-        sku=product["sku"],
-        category=product["category"],
-        price=product["price"],
-        image=product.get("image", ""),
-        images=product.get("images", []),
-        description=product["description"],
-        long_description=product.get("long_description"),
-        inStock=product.get("inStock", True),
-        stock_quantity=product.get("stock_quantity", 0),
-        rating=product.get("rating", 0.0),
-        reviews=product.get("reviews", 0),
-        specifications=product.get("specifications", {}),
-        features=product.get("features", []),
-        applications=product.get("applications", []),
-        created_at=product["created_at"],
-        updated_at=product["updated_at"]
+    validators = product_validators(product)
+    headers = validator_headers("catalogue", validators)
+    if not_modified(request, validators):
+        return not_modified_response(request, headers)
+    return precompressed_response(
+        request,
+        precompressed_cache,
+        (request.url.path, validators["etag"]),
+        lambda: product_json(product),
+        headers
     )
 
 # CART ENDPOINTS
 @app.get("/cart")
-async def get_cart(current_user: dict = Depends(get_current_user)):
+async def get_cart(
+    reprice: bool = Query(True, description="Refresh items whose product price or details changed"),
+    current_user: dict = Depends(get_current_user)
+):
     """Get user's cart"""
-    cart = db_manager.get_user_cart(str(current_user["_id"]))
+    cart = await cart_store.get(str(current_user["_id"]), reprice=reprice)
     return {"cart": cart}
 
 @app.post("/cart/add")
@@ -542,39 +900,50 @@ async def add_to_cart(
     """Add item to cart"""
     user_id = str(current_user["_id"])
     
-    # Get current cart
-    cart = db_manager.get_user_cart(user_id)
-    items = cart.get("items", [])
+    # Bump the quantity in place if the item is already in the cart
+    if await cart_store.increment_item(user_id, cart_item.product_id, cart_item.quantity):
+        return {"message": "Item added to cart successfully"}
     
-    # Check if item already exists in cart
-    existing_item = next((item for item in items if item["product_id"] == cart_item.product_id), None)
-    
-    if existing_item:
-        # Update quantity
-        existing_item["quantity"] += cart_item.quantity
-    else:
-        # Add new item
-        # Get product details
-        product = db_manager.get_product_by_id(cart_item.product_id)
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        
-        items.append({
-            "product_id": cart_item.product_id,
-            "product_name": product["name"],
-            "product_sku": product["sku"],
-            "price": product["price"],
-            "quantity": cart_item.quantity,
-            "image": product.get("image", "")
-        })
+    # Otherwise add the item with product details
+    product = await db_manager.get_product_by_id(cart_item.product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
     
-    # Update cart
-    success = db_manager.update_user_cart(user_id, items)
+    success = await cart_store.push_item(user_id, {
+        "product_id": cart_item.product_id,
+        **cart_item_snapshot(product),
+        "quantity": cart_item.quantity
+    })
     if not success:
         raise HTTPException(status_code=500, detail="Failed to update cart")
     
     return {"message": "Item added to cart successfully"}
 
+@app.put("/cart/items/{product_id}")
+async def set_cart_item_quantity(
+    product_id: str,
+    update: CartItemQuantity,
+    current_user: dict = Depends(get_current_user)
+):
+    """Set the quantity of a single cart item (0 removes it)"""
+    success = await cart_store.set_item_quantity(str(current_user["_id"]), product_id, update.quantity)
+    if not success:
+        raise HTTPException(status_code=404, detail="Item not in cart")
+    
+    return {"message": "Cart item updated successfully"}
+
+@app.delete("/cart/items/{product_id}")
+async def remove_cart_item(
+    product_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Remove a single item from the cart"""
+    success = await cart_store.remove_item(str(current_user["_id"]), product_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Item not in cart")
+    
+    return {"message": "Item removed from cart successfully"}
+
 @app.put("/cart/update")
 async def update_cart(
     cart_update: CartUpdate,
@@ -584,23 +953,20 @@ async def update_cart(
     user_id = str(current_user["_id"])
     
     # Convert CartUpdate to cart items with product details
+    wanted = [cart_item for cart_item in cart_update.items if cart_item.quantity > 0]
+    products = await db_manager.get_products_by_ids([cart_item.product_id for cart_item in wanted])
+    
     items = []
-    for cart_item in cart_update.items:
-        if cart_item.quantity <= 0:
-            continue  # Skip items with zero quantity
-            
-        product = db_manager.get_product_by_id(cart_item.product_id)
+    for cart_item in wanted:
+        product = products.get(cart_item.product_id)
         if product:
             items.append({
                 "product_id": cart_item.product_id,
-                "product_name": product["name"],
-                "product_sku": product["sku"],
-                "price": product["price"],
-                "quantity": cart_item.quantity,
-                "image": product.get("image", "")
+                **cart_item_snapshot(product),
+                "quantity": cart_item.quantity
             })
     
-    success = db_manager.update_user_cart(user_id, items)
+    success = await cart_store.replace_items(user_id, items)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to update cart")
     
@@ -610,7 +976,7 @@ async def update_cart(
 async def clear_cart(current_user: dict = Depends(get_current_user)):
     """Clear user's cart"""
     user_id = str(current_user["_id"])
-    success = db_manager.clear_user_cart(user_id)
+    success = await cart_store.clear(user_id)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to clear cart")
     
@@ -619,19 +985,43 @@ async def clear_cart(current_user: dict = Depends(get_current_user)):
 # --------------------------praveen
 
 @app.get("/orders/my-orders")
-async def get_my_orders(current_user: dict = Depends(get_current_user)):
-    """Get orders for the current logged-in user"""
+async def get_my_orders(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    order_status: Optional[str] = Query(None, alias="status"),
+    search: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get order summaries for the current logged-in user
+    
+    Each order carries its totals, status, item_count and a preview of the
+    first items; the full order comes from /orders/{order_id}. status and
+    search filter the history; the first page also carries a summary of
+    totals across all of the user's orders.
+    """
     try:
         user_id = str(current_user["_id"])
-        orders = await db_manager.get_user_orders(user_id)
-        return {"orders": orders}
+        page = await db_manager.get_user_orders_page(user_id, skip, limit, cursor, order_status, search)
+        response = {
+            "orders": page["items"],
+            "total": page["total"],
+            "skip": skip,
+            "limit": limit,
+            "next_cursor": page["next_cursor"]
+        }
+        if cursor is None:
+            response["summary"] = await db_manager.get_user_order_summary(user_id)
+        return response
+    except InvalidCursor:
+        raise
     except Exception as e:
         print(f"Get my orders error: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve user orders")
 
 
 @app.get("/orders")
-async def get_all_orders():
+async def get_all_orders(current_user: dict = Depends(admin_required)):
     """Get all orders from the database (admin)"""
     try:
         orders = await db_manager.get_all_orders()
@@ -647,13 +1037,24 @@ async def get_all_orders():
 
 # CUSTOMER ORDER ENDPOINTS
 @app.post("/orders")
-async def create_order(order: OrderCreate, current_user: dict = Depends(get_current_user)):
+async def create_order(
+    order: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: dict = Depends(get_current_user)
+):
     """Create a new order"""
     try:
+        user_id = str(current_user["_id"])
+        checkout_key = checkout_idempotency_key(user_id, idempotency_key)
+        request_hash = checkout_request_hash(order)
+        replay = await replay_checkout(checkout_key, user_id, request_hash)
+        if replay:
+            return replay
+        
         # Prepare order data
         order_data = {
             "user_id": str(current_user["_id"]),
-            "items": [item.dict() for item in order.items],
+            "items": await build_order_items(order.items),
             "shipping_address": order.shipping_address.dict(),
             "billing_address": order.billing_address.dict(),
             "shipping_method": order.shipping_method,
@@ -666,31 +1067,51 @@ async def create_order(order: OrderCreate, current_user: dict = Depends(get_curr
             "payment_status": "pending"
         }
         
-        # Create order in database
-        order_id = db_manager.create_order(order_data)
-        
-        # Update user's fabrication status to 2 (added to cart/ordered)
-        db_manager.update_user(str(current_user["_id"]), {"fabrication_status": 2})
-        
-        # Clear user's cart after successful order
-        db_manager.clear_user_cart(str(current_user["_id"]))
+        # Reserve stock, then create the order, clear the cart and set
+        # fabrication status 2 (added to cart/ordered) in one transaction
+        order_id = await place_order(
+            user_id, order_data,
+            fabrication_status=2,
+            idempotency_key=checkout_key,
+            request_hash=request_hash
+        )
         
-        return {"success": True, "order_id": order_id, "message": "Order created successfully"}
+        return checkout_response(order_id)
         
+    except (HTTPException, InsufficientStock, IdempotencyKeyReused):
+        raise
     except Exception as e:
         print(f"Order creation error: {e}")
         raise HTTPException(status_code=500, detail="Failed to create order")
 
 @app.get("/orders/my-orders")
-async def get_my_orders(current_user: dict = Depends(get_current_user)):
-    """Get orders for the current user"""
+async def get_my_orders(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    order_status: Optional[str] = Query(None, alias="status"),
+    search: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get order summaries for the current user"""
     try:
-        # Get user's orders from database
+        # Get a page of the user's order summaries from database
         user_id = str(current_user["_id"])
-        orders = db_manager.get_user_orders(user_id)
+        page = await db_manager.get_user_orders_page(user_id, skip, limit, cursor, order_status, search)
         
-        return {"orders": orders}
+        response = {
+            "orders": page["items"],
+            "total": page["total"],
+            "skip": skip,
+            "limit": limit,
+            "next_cursor": page["next_cursor"]
+        }
+        if cursor is None:
+            response["summary"] = await db_manager.get_user_order_summary(user_id)
+        return response
         
+    except InvalidCursor:
+        raise
     except Exception as e:
         print(f"Get orders error: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve orders")
@@ -699,7 +1120,7 @@ async def get_my_orders(current_user: dict = Depends(get_current_user)):
 async def get_order_by_id(order_id: str, current_user: dict = Depends(get_current_user)):
     """Get specific order by ID"""
     try:
-        order = db_manager.get_order_by_id(order_id)
+        order = await db_manager.get_order_by_id(order_id)
         
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
@@ -732,7 +1153,7 @@ async def update_fabrication_status(
             detail="Not authorized to update this user's fabrication status"
         )
     
-    success = db_manager.update_user(update_data.user_id, {
+    success = await db_manager.update_user(update_data.user_id, {
         "fabrication_status": update_data.status
     })
     
@@ -754,19 +1175,19 @@ async def create_project(project: ProjectCreate, current_user: dict = Depends(ge
         "deadline": project.deadline,
     }
     
-    project_id = db_manager.create_project(project_data)
+    project_id = await db_manager.create_project(project_data)
     return {"project_id": project_id, "message": "Project created successfully"}
 
 @app.get("/projects")
 async def get_user_projects(current_user: dict = Depends(get_current_user)):
     """Get all projects for the current user"""
-    projects = db_manager.get_user_projects(str(current_user["_id"]))
+    projects = await db_manager.get_user_projects(str(current_user["_id"]))
     return {"projects": projects}
 
 @app.get("/quotes")
 async def get_user_quotes(current_user: dict = Depends(get_current_user)):
     """Get all quotes for the current user"""
-    quotes = db_manager.get_user_quotes(str(current_user["_id"]))
+    quotes = await db_manager.get_user_quotes(str(current_user["_id"]))
     return {"quotes": quotes}
 
 @app.post("/contact")
@@ -781,7 +1202,7 @@ async def submit_contact_message(message: ContactMessage):
         "message": message.message,
     }
     
-    message_id = db_manager.create_contact_message(message_data)
+    message_id = await db_manager.create_contact_message(message_data)
     return {"message_id": message_id, "message": "Contact message submitted successfully"}
 
 @app.get("/components/search")
@@ -791,13 +1212,13 @@ async def search_components(
     current_user: dict = Depends(get_current_user)
 ):
     """Search components"""
-    components = db_manager.search_components(q, category)
+    components = await db_manager.search_components(q, category)
     return {"components": components}
 
 @app.get("/components/categories")
 async def get_component_categories(current_user: dict = Depends(get_current_user)):
     """Get all component categories"""
-    categories = db_manager.get_component_categories()
+    categories = await db_manager.get_component_categories()
     return {"categories": categories}
 
 # ADMIN USER MANAGEMENT ROUTES
@@ -805,11 +1226,15 @@ async def get_component_categories(current_user: dict = Depends(get_current_user
 async def get_all_users_admin(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    fabrication_status: Optional[int] = None,
     current_user: dict = Depends(admin_required)
 ):
     """Get all users with pagination (admin only)"""
-    users = db_manager.get_all_users(skip, limit)
-    total = len(db_manager.get_all_users(0, 10000))  # Get total count
+    page = await db_manager.get_users_page(skip, limit, cursor, role, is_active, fabrication_status)
+    users, total = page["items"], page["total"]
     
     user_responses = []
     for user in users:
@@ -830,7 +1255,8 @@ async def get_all_users_admin(
         "users": user_responses,
         "total": total,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": page["next_cursor"]
     }
 
 @app.put("/admin/users/{user_id}")
@@ -842,7 +1268,7 @@ async def update_user_admin(
     """Update user information (admin only)"""
     update_data = {k: v for k, v in user_update.dict().items() if v is not None}
     
-    success = db_manager.update_user(user_id, update_data)
+    success = await db_manager.update_user(user_id, update_data)
     if not success:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -855,11 +1281,11 @@ async def delete_user_admin(
 ):
     """Delete user (admin only)"""
     # Don't allow deleting admin users
-    user = db_manager.get_user_by_id(user_id)
+    user = await db_manager.get_user_by_id(user_id)
     if user and user.get("role") == "admin":
         raise HTTPException(status_code=400, detail="Cannot delete admin users")
     
-    success = db_manager.delete_user(user_id)
+    success = await db_manager.delete_user(user_id)
     if not success:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -869,6 +1295,7 @@ async def get_users_by_fabrication_status(
     status: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(admin_required)
 ):
     """Get users by fabrication status (admin only)"""
@@ -877,21 +1304,19 @@ async def get_users_by_fabrication_status(
         if status not in [0, 1, 2]:
             raise HTTPException(status_code=400, detail="Status must be 0, 1, or 2")
         
-        # Use the database method to get users by fabrication status
-        users = db_manager.get_users_by_fabrication_status(status)
-        
-        # Apply pagination
-        start_idx = skip
-        end_idx = min(skip + limit, len(users))
-        paginated_users = users[start_idx:end_idx]
+        # Paginate in the database rather than slicing the full list
+        page = await db_manager.get_users_by_fabrication_status(status, skip, limit, cursor)
         
         return {
-            "users": paginated_users,
-            "total": len(users),
+            "users": page["items"],
+            "total": page["total"],
             "skip": skip,
-            "limit": limit
+            "limit": limit,
+            "next_cursor": page["next_cursor"]
         }
         
+    except (HTTPException, InvalidCursor):
+        raise
     except Exception as e:
         logger.error(f"Failed to get users by fabrication status: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve users")
@@ -899,44 +1324,27 @@ async def get_users_by_fabrication_status(
 # ADMIN PRODUCT MANAGEMENT ROUTES
 @app.get("/admin/products", response_model=Dict[str, Any])
 async def get_all_products_admin(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     category: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma separated product fields or presets: card, detail"),
     current_user: dict = Depends(admin_required)
 ):
     """Get all products with pagination (admin only)"""
-    products = db_manager.get_all_products(skip, limit, category)
-    total = db_manager.get_products_count(category)
-    
-    product_responses = []
-    for product in products:
-        product_responses.append(ProductResponse(
-            id=product["_id"],
-            name=product["name"],
-            sku=product["sku"],
-            category=product["category"],
-            price=product["price"],
-            image=product.get("image", ""),
-            images=product.get("images", []),
-            description=product["description"],
-            long_description=product.get("long_description"),
-            inStock=product.get("inStock", True),
-            stock_quantity=product.get("stock_quantity", 0),
-            rating=product.get("rating", 0.0),
-            reviews=product.get("reviews", 0),
-            specifications=product.get("specifications", {}),
-            features=product.get("features", []),
-            applications=product.get("applications", []),
-            created_at=product["created_at"],
-            updated_at=product["updated_at"]
-        ))
-    
-    return {
-        "products": product_responses,
-        "total": total,
-        "skip": skip,
-        "limit": limit
-    }
+    selected_fields = parse_product_fields(fields)
+    page = await db_manager.get_products_page(
+        skip, limit, category,
+        estimate_count=True,
+        cursor=cursor,
+        projection=product_projection(selected_fields)
+    )
+    validators = page_validators(page)
+    headers = validator_headers("admin", validators)
+    if not_modified(request, validators, use_last_modified=False):
+        return not_modified_response(request, headers)
+    return products_page_response(page, skip, limit, headers, selected_fields)
 
 @app.post("/admin/products", response_model=ProductResponse)
 async def create_product_admin(
@@ -962,29 +1370,10 @@ async def create_product_admin(
         "reviews": 0
     }
     
-    product_id = db_manager.create_product(product_data)
-    created_product = db_manager.get_product_by_id(product_id)
-    
-    return ProductResponse(
-        id=created_product["_id"],
-        name=created_product["name"],
-        sku=created_product["sku"],
-        category=created_product["category"],
-        price=created_product["price"],
-        image=created_product.get("image", ""),
-        images=created_product.get("images", []),
-        description=created_product["description"],
-        long_description=created_product.get("long_description"),
-        inStock=created_product.get("inStock", True),
-        stock_quantity=created_product.get("stock_quantity", 0),
-        rating=created_product.get("rating", 0.0),
-        reviews=created_product.get("reviews", 0),
-        specifications=created_product.get("specifications", {}),
-        features=created_product.get("features", []),
-        applications=created_product.get("applications", []),
-        created_at=created_product["created_at"],
-        updated_at=created_product["updated_at"]
-    )
+    product_id = await db_manager.create_product(product_data)
+    created_product = await db_manager.get_product_by_id(product_id)
+    
+    return product_response(created_product)
 
 @app.put("/admin/products/{product_id}")
 async def update_product_admin(
@@ -999,7 +1388,7 @@ async def update_product_admin(
     if "stock_quantity" in update_data:
         update_data["inStock"] = update_data["stock_quantity"] > 0
     
-    success = db_manager.update_product(product_id, update_data)
+    success = await db_manager.update_product(product_id, update_data)
     if not success:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -1011,7 +1400,7 @@ async def delete_product_admin(
     current_user: dict = Depends(admin_required)
 ):
     """Delete product (admin only)"""
-    success = db_manager.delete_product(product_id)
+    success = await db_manager.delete_product(product_id)
     if not success:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -1023,23 +1412,21 @@ async def get_all_orders_admin(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     status: Optional[str] = None,
+    cursor: Optional[str] = None,
     current_user: dict = Depends(admin_required)
 ):
     """Get all orders with pagination (admin only)"""
-    orders = db_manager.get_all_orders(skip, limit, status)
-    total = db_manager.get_orders_count(status)
+    page = await db_manager.get_orders_page(skip, limit, status, estimate_count=True, cursor=cursor, with_users=True)
+    orders, total = page["items"], page["total"]
     
     order_responses = []
     for order in orders:
-        # Get user info
-        user = db_manager.get_user_by_id(order["user_id"])
-        
         order_responses.append(OrderResponse(
             id=order["_id"],
             order_number=order.get("order_number", f"ORD-{order['_id'][:8]}"),
             user_id=order["user_id"],
-            user_name=user["full_name"] if user else "Unknown User",
-            user_email=user["email"] if user else "unknown@email.com",
+            user_name=order["user_name"],
+            user_email=order["user_email"],
             total=order.get("total", 0.0),
             status=order.get("status", "pending"),
             payment_status=order.get("payment_status", "pending"),
@@ -1051,7 +1438,8 @@ async def get_all_orders_admin(
         "orders": order_responses,
         "total": total,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": page["next_cursor"]
     }
 
 @app.put("/admin/orders/{order_id}")
@@ -1063,7 +1451,7 @@ async def update_order_admin(
     """Update order status (admin only)"""
     update_data = {k: v for k, v in order_update.dict().items() if v is not None}
     
-    success = db_manager.update_order(order_id, update_data)
+    success = await db_manager.update_order(order_id, update_data)
     if not success:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -1075,16 +1463,7 @@ async def get_admin_analytics(
     current_user: dict = Depends(admin_required)
 ):
     """Get admin dashboard analytics"""
-    stats = db_manager.get_admin_stats()
-    
-    # Add enquiry stats
-    try:
-        total_enquiries = db_manager.get_enquiries_count()
-        new_enquiries = db_manager.get_enquiries_count(status="new")
-        design_enquiries = db_manager.get_enquiries_count(enquiry_type="design_enquiry")
-        product_enquiries = db_manager.get_enquiries_count(enquiry_type="product_enquiry")
-    except:
-        total_enquiries = new_enquiries = design_enquiries = product_enquiries = 0
+    stats = await db_manager.get_materialized_admin_stats()
     
     return {
         "totalUsers": stats.get("total_users", 0),
@@ -1095,27 +1474,47 @@ async def get_admin_analytics(
         "lowStockProducts": stats.get("low_stock_products", 0),
         "newMessages": stats.get("new_messages", 0),
         "newQuotes": stats.get("new_quotes", 0),
-        "totalEnquiries": total_enquiries,
-        "newEnquiries": new_enquiries,
-        "designEnquiries": design_enquiries,
-        "productEnquiries": product_enquiries
+        "totalEnquiries": stats.get("total_enquiries", 0),
+        "newEnquiries": stats.get("new_enquiries", 0),
+        "designEnquiries": stats.get("design_enquiries", 0),
+        "productEnquiries": stats.get("product_enquiries", 0)
+    }
+
+@app.get("/admin/metrics/password-hashing")
+async def get_password_hashing_metrics(
+    current_user: dict = Depends(admin_required)
+):
+    """Get password hashing pool latency metrics (admin only)"""
+    return password_hasher.get_metrics()
+
+@app.get("/admin/metrics/catalogue-cache")
+async def get_catalogue_cache_metrics(
+    current_user: dict = Depends(admin_required)
+):
+    """Get catalogue and product JSON cache hit/miss counters (admin only)"""
+    return {
+        **catalogue_cache.get_metrics(),
+        "serialization": product_json_cache.get_metrics(),
+        "compression": precompressed_cache.get_metrics()
     }
 
 @app.get("/admin/messages")
 async def get_contact_messages_admin(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(admin_required)
 ):
     """Get contact messages (admin only)"""
-    messages = db_manager.get_contact_messages(skip, limit)
-    total = db_manager.get_contact_messages_count()
+    page = await db_manager.get_contact_messages_page(skip, limit, estimate_count=True, cursor=cursor)
+    messages, total = page["items"], page["total"]
     
     return {
         "messages": messages,
         "total": total,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": page["next_cursor"]
     }
 
 # CUSTOMER ENQUIRY ENDPOINTS
@@ -1136,11 +1535,11 @@ async def create_enquiry(enquiry: EnquiryCreate, current_user: dict = Depends(ge
             "replies": []
         }
         
-        enquiry_id = db_manager.create_enquiry(enquiry_data)
+        enquiry_id = await db_manager.create_enquiry(enquiry_data)
         
         # Update user's fabrication status to 1 (visited/interested)
         if current_user.get("fabrication_status", 0) == 0:
-            db_manager.update_user(str(current_user["_id"]), {"fabrication_status": 1})
+            await db_manager.update_user(str(current_user["_id"]), {"fabrication_status": 1})
         
         return {"success": True, "enquiry_id": enquiry_id, "message": "Enquiry submitted successfully"}
         
@@ -1153,7 +1552,7 @@ async def get_my_enquiries(current_user: dict = Depends(get_current_user)):
     """Get enquiries for the current user"""
     try:
         user_id = str(current_user["_id"])
-        enquiries = db_manager.get_user_enquiries(user_id)
+        enquiries = await db_manager.get_user_enquiries(user_id)
         
         return {"enquiries": enquiries}
         
@@ -1165,7 +1564,7 @@ async def get_my_enquiries(current_user: dict = Depends(get_current_user)):
 async def get_enquiry_by_id(enquiry_id: str, current_user: dict = Depends(get_current_user)):
     """Get specific enquiry by ID"""
     try:
-        enquiry = db_manager.get_enquiry_by_id(enquiry_id)
+        enquiry = await db_manager.get_enquiry_by_id(enquiry_id)
         
         if not enquiry:
             raise HTTPException(status_code=404, detail="Enquiry not found")
@@ -1189,17 +1588,15 @@ async def get_all_enquiries_admin(
     limit: int = Query(100, ge=1, le=1000),
     enquiry_type: Optional[str] = None,
     status: Optional[str] = None,
+    cursor: Optional[str] = None,
     current_user: dict = Depends(admin_required)
 ):
     """Get all enquiries with pagination (admin only)"""
-    enquiries = db_manager.get_all_enquiries(skip, limit, enquiry_type, status)
-    total = db_manager.get_enquiries_count(enquiry_type, status)
+    page = await db_manager.get_enquiries_page(skip, limit, enquiry_type, status, estimate_count=True, cursor=cursor, with_users=True)
+    enquiries, total = page["items"], page["total"]
     
     enquiry_responses = []
     for enquiry in enquiries:
-        # Get user info
-        user = db_manager.get_user_by_id(enquiry["user_id"])
-        
         enquiry_responses.append(EnquiryResponse(
             id=enquiry["_id"],
             enquiry_type=enquiry["enquiry_type"],
@@ -1213,8 +1610,8 @@ async def get_all_enquiries_admin(
             status=enquiry.get("status", "new"),
             replied=enquiry.get("replied", False),
             user_id=enquiry["user_id"],
-            user_name=user["full_name"] if user else "Unknown User",
-            user_email=user["email"] if user else "unknown@email.com",
+            user_name=enquiry["user_name"],
+            user_email=enquiry["user_email"],
             created_at=enquiry["created_at"],
             updated_at=enquiry.get("updated_at", enquiry["created_at"]),
             replies=enquiry.get("replies", [])
@@ -1224,7 +1621,8 @@ async def get_all_enquiries_admin(
         "enquiries": enquiry_responses,
         "total": total,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": page["next_cursor"]
     }
 
 @app.post("/admin/enquiries/{enquiry_id}/reply")
@@ -1242,7 +1640,7 @@ async def reply_to_enquiry_admin(
             "attachments": reply.attachments or []
         }
         
-        success = db_manager.add_enquiry_reply(enquiry_id, reply_data)
+        success = await db_manager.add_enquiry_reply(enquiry_id, reply_data)
         if not success:
             raise HTTPException(status_code=404, detail="Enquiry not found")
         
@@ -1261,7 +1659,7 @@ async def update_enquiry_status_admin(
     current_user: dict = Depends(admin_required)
 ):
     """Update enquiry status (admin only)"""
-    success = db_manager.update_enquiry(enquiry_id, {"status": status_update.status})
+    success = await db_manager.update_enquiry(enquiry_id, {"status": status_update.status})
     if not success:
         raise HTTPException(status_code=404, detail="Enquiry not found")
     
@@ -1285,11 +1683,15 @@ async def create_razorpay_order(
             "payment_capture": 1
         })
         
+        await reserve_cart_for_payment(str(current_user["_id"]), razorpay_order["id"])
+        
         return {
             "success": True,
             "order": razorpay_order
         }
         
+    except InsufficientStock:
+        raise
     except Exception as e:
         print(f"Razorpay order creation error: {e}")
         raise HTTPException(status_code=500, detail="Failed to create Razorpay order")
@@ -1328,10 +1730,22 @@ async def verify_payment(
 @app.post("/create-order-with-payment")
 async def create_order_with_payment(
     order_data: OrderCreateWithPayment,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: dict = Depends(get_current_user)
 ):
-    """Create order after successful payment"""
+    """Create order after successful payment
+    
+    Retries with the same Idempotency-Key header, or without one for the
+    same Razorpay payment, replay the original response.
+    """
     try:
+        user_id = str(current_user["_id"])
+        checkout_key = checkout_idempotency_key(user_id, idempotency_key, order_data.razorpay_payment_id)
+        request_hash = checkout_request_hash(order_data)
+        replay = await replay_checkout(checkout_key, user_id, request_hash)
+        if replay:
+            return replay
+        
         # First verify the payment
         params_dict = {
             'razorpay_order_id': order_data.razorpay_order_id,
@@ -1345,7 +1759,7 @@ async def create_order_with_payment(
         # Create order in database
         order_db_data = {
             "user_id": str(current_user["_id"]),
-            "items": [item.dict() for item in order_data.items],
+            "items": await build_order_items(order_data.items),
             "shipping_address": order_data.shipping_address.dict(),
             "billing_address": order_data.billing_address.dict(),
             "shipping_method": order_data.shipping_method,
@@ -1361,17 +1775,30 @@ async def create_order_with_payment(
             "payment_verified": True
         }
         
-        order_id = db_manager.create_order(order_db_data)
+        # Commit the stock held when the payment started if it matches the order
+        reservation_id = None
+        reservation = await db_manager.get_held_reservation(user_id, order_data.razorpay_order_id)
+        if reservation:
+            if reservation_lines(reservation["items"]) == reservation_lines(order_db_data["items"]):
+                reservation_id = reservation["_id"]
+            else:
+                await db_manager.release_reservation(reservation["_id"])
         
-        # Clear user's cart after successful order
-        db_manager.clear_user_cart(str(current_user["_id"]))
+        # Create the order and clear the cart in one transaction
+        try:
+            order_id = await place_order(user_id, order_db_data, reservation_id, idempotency_key=checkout_key, request_hash=request_hash)
+        except InsufficientStock as e:
+            # The payment is already captured, so keep the order and flag it
+            logger.warning(f"Paid order {order_data.razorpay_payment_id} backordered: {e}")
+            order_db_data["stock_status"] = "backordered"
+            await cart_store.flush(user_id)
+            order_id = await db_manager.checkout(order_db_data, idempotency_key=checkout_key, request_hash=request_hash)
+            cart_store.discard(user_id)
         
-        return {
-            "success": True,
-            "order_id": order_id,
-            "message": "Order created successfully"
-        }
+        return checkout_response(order_id)
         
+    except (HTTPException, IdempotencyKeyReused):
+        raise
     except Exception as e:
         print(f"Order creation error: {e}")
         raise HTTPException(status_code=500, detail="Failed to create order")
@@ -1413,11 +1840,15 @@ async def create_order_endpoint(
         
         print(f"Razorpay order created successfully: {razorpay_order}")
         
+        await reserve_cart_for_payment(str(current_user["_id"]), razorpay_order["id"])
+        
         return {
             "success": True,
             "order": razorpay_order
         }
         
+    except InsufficientStock:
+        raise
     except Exception as e:
         print(f"=== BACKEND ERROR ===")
         print(f"Error type: {type(e).__name__}")
@@ -1438,7 +1869,11 @@ async def health_check():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Close database connection on shutdown"""
+    for task in background_tasks:
+        task.cancel()
+    await cart_store.flush_all()
     db_manager.close()
+    password_hasher.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,240 @@
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import logging
+
+from database import apply_product_snapshots
+
+logger = logging.getLogger(__name__)
+
+class CartEntry:
+    def __init__(self, cart: Dict[str, Any]):
+        self.cart = cart
+        self.version = 0
+        self.flushed_version = 0
+
+    @property
+    def dirty(self) -> bool:
+        return self.version != self.flushed_version
+
+class CartStore:
+    """Cart store with an opt-in write-behind, bounded in-process LRU tier.
+
+    By default (CART_WRITE_DELAY_SECONDS=0) every call goes straight to the
+    atomic DatabaseManager cart operations.
+
+    With a positive write delay, cart reads are served from memory once
+    loaded. Mutations update the in-memory cart and schedule a single Mongo
+    write after the delay, so a burst of changes to one cart is coalesced
+    into one update_user_cart call. Dirty carts are written immediately by
+    flush() (used before checkout), on clear() and by flush_all() on
+    shutdown; a hard kill can lose at most the last write delay of changes.
+    Those writes replace the whole items array and the tier is per process,
+    so only enable it with a single worker that is the cart's only writer.
+    """
+
+    def __init__(self, db_manager, max_size: Optional[int] = None, write_delay: Optional[float] = None):
+        self.db = db_manager
+        self.max_size = max_size or int(os.getenv("CART_CACHE_SIZE", "5000"))
+        self.write_delay = write_delay if write_delay is not None else float(os.getenv("CART_WRITE_DELAY_SECONDS", "0"))
+        self._entries: "OrderedDict[str, CartEntry]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._evicted: Dict[str, asyncio.Task] = {}
+
+    @property
+    def write_behind(self) -> bool:
+        return self.write_delay > 0
+
+    async def _load(self, user_id: str) -> CartEntry:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+            return entry
+
+        # Don't read a cart back while its evicted copy is still being written
+        evicting = self._evicted.get(user_id)
+        if evicting is not None:
+            await asyncio.shield(evicting)
+
+        cart = await self.db.get_user_cart(user_id)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = CartEntry(cart)
+            self._entries[user_id] = entry
+            self._evict()
+        return entry
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            user_id, entry = self._entries.popitem(last=False)
+            if entry.dirty:
+                pending = self._pending.pop(user_id, None)
+                if pending:
+                    pending.cancel()
+                self._evicted[user_id] = asyncio.create_task(self._write_evicted(user_id, entry))
+
+    async def _write_evicted(self, user_id: str, entry: CartEntry):
+        try:
+            await self._write(user_id, entry)
+        finally:
+            self._evicted.pop(user_id, None)
+
+    def _changed(self, user_id: str, entry: CartEntry):
+        entry.version += 1
+        if user_id not in self._pending:
+            self._pending[user_id] = asyncio.create_task(self._flush_later(user_id))
+
+    async def _flush_later(self, user_id: str):
+        try:
+            await asyncio.sleep(self.write_delay)
+        except asyncio.CancelledError:
+            return
+        self._pending.pop(user_id, None)
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.dirty:
+            await self._write(user_id, entry)
+
+    async def _write(self, user_id: str, entry: CartEntry) -> bool:
+        version = entry.version
+        items = [dict(item) for item in entry.cart.get("items", [])]
+        success = await self.db.update_user_cart(user_id, items)
+        if success:
+            entry.flushed_version = max(entry.flushed_version, version)
+        elif user_id in self._entries and user_id not in self._pending:
+            # Keep the change in memory and try again after the next delay
+            self._pending[user_id] = asyncio.create_task(self._flush_later(user_id))
+        return success
+
+    @staticmethod
+    def _copy(cart: Dict[str, Any]) -> Dict[str, Any]:
+        return {**cart, "items": [dict(item) for item in cart.get("items", [])]}
+
+    async def get(self, user_id: str, reprice: bool = False) -> Dict[str, Any]:
+        """Get the cart; with reprice, refresh items whose product has changed"""
+        if not self.write_behind:
+            cart = await self.db.get_user_cart(user_id)
+            if reprice:
+                products = await self.db.get_repriced_products(cart["items"])
+                refreshed = apply_product_snapshots(cart["items"], products)
+                await self.db.save_cart_item_snapshots(user_id, refreshed)
+            return cart
+
+        entry = await self._load(user_id)
+        if reprice:
+            products = await self.db.get_repriced_products(entry.cart["items"])
+            # Apply to the items as they are now, not as they were before the query
+            if apply_product_snapshots(entry.cart["items"], products):
+                self._changed(user_id, entry)
+        return self._copy(entry.cart)
+
+    async def increment_item(self, user_id: str, product_id: str, quantity: int) -> bool:
+        if not self.write_behind:
+            return await self.db.increment_cart_item(user_id, product_id, quantity)
+
+        entry = await self._load(user_id)
+        item = next((item for item in entry.cart["items"] if item["product_id"] == product_id), None)
+        if item is None:
+            return False
+        item["quantity"] += quantity
+        self._changed(user_id, entry)
+        return True
+
+    async def push_item(self, user_id: str, item: Dict[str, Any]) -> bool:
+        if not self.write_behind:
+            return await self.db.push_cart_item(user_id, item)
+
+        # The product may have been added while its details were loading
+        if await self.increment_item(user_id, item["product_id"], item["quantity"]):
+            return True
+        entry = await self._load(user_id)
+        entry.cart["items"].append(dict(item))
+        self._changed(user_id, entry)
+        return True
+
+    async def set_item_quantity(self, user_id: str, product_id: str, quantity: int) -> bool:
+        if not self.write_behind:
+            return await self.db.set_cart_item_quantity(user_id, product_id, quantity)
+        if quantity <= 0:
+            return await self.remove_item(user_id, product_id)
+
+        entry = await self._load(user_id)
+        item = next((item for item in entry.cart["items"] if item["product_id"] == product_id), None)
+        if item is None:
+            return False
+        item["quantity"] = quantity
+        self._changed(user_id, entry)
+        return True
+
+    async def remove_item(self, user_id: str, product_id: str) -> bool:
+        if not self.write_behind:
+            return await self.db.remove_cart_item(user_id, product_id)
+
+        entry = await self._load(user_id)
+        items = [item for item in entry.cart["items"] if item["product_id"] != product_id]
+        if len(items) == len(entry.cart["items"]):
+            return False
+        entry.cart["items"] = items
+        self._changed(user_id, entry)
+        return True
+
+    async def replace_items(self, user_id: str, items: List[Dict[str, Any]]) -> bool:
+        if not self.write_behind:
+            return await self.db.update_user_cart(user_id, items)
+
+        entry = await self._load(user_id)
+        entry.cart["items"] = [dict(item) for item in items]
+        self._changed(user_id, entry)
+        return True
+
+    async def clear(self, user_id: str) -> bool:
+        """Empty the cart and write it through immediately"""
+        pending = self._pending.pop(user_id, None)
+        if pending:
+            pending.cancel()
+
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            entry.cart["items"] = []
+            entry.version += 1
+            entry.flushed_version = entry.version
+        return await self.db.clear_user_cart(user_id)
+
+    async def flush(self, user_id: str) -> bool:
+        """Write a dirty cart now instead of waiting for the delay"""
+        pending = self._pending.pop(user_id, None)
+        if pending:
+            pending.cancel()
+
+        evicting = self._evicted.get(user_id)
+        if evicting is not None:
+            await asyncio.shield(evicting)
+
+        entry = self._entries.get(user_id)
+        if entry is None or not entry.dirty:
+            return True
+        return await self._write(user_id, entry)
+
+    def discard(self, user_id: str):
+        """Drop the cached cart after it was changed directly in MongoDB"""
+        pending = self._pending.pop(user_id, None)
+        if pending:
+            pending.cancel()
+        self._entries.pop(user_id, None)
+
+    async def flush_all(self):
+        """Write every dirty cart; called on shutdown"""
+        for task in list(self._pending.values()):
+            task.cancel()
+        self._pending.clear()
+
+        dirty = [(user_id, entry) for user_id, entry in self._entries.items() if entry.dirty]
+        results = await asyncio.gather(
+            *(self._write(user_id, entry) for user_id, entry in dirty),
+            *self._evicted.values(),
+            return_exceptions=True
+        )
+        failures = sum(1 for result in results if result is False or isinstance(result, Exception))
+        if failures:
+            logger.error(f"Failed to flush {failures} carts on shutdown")
+        logger.info(f"Flushed {len(dirty)} carts")
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CatalogueCache:
+    """Bounded LRU + TTL cache of catalogue reads keyed by query shape.
+
+    Every product write bumps the catalogue version, which empties the
+    cache; a load that started before a bump is returned but not stored.
+    Stock moves only invalidate the entries tagged with that product.
+    Writes made by other workers arrive through the products change stream
+    (see DatabaseManager.watch_product_changes), and the TTL bounds
+    staleness where change streams are unavailable.
+
+    Cached values are shared between requests and must not be mutated.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size or int(os.getenv("CATALOGUE_CACHE_SIZE", "1000"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("CATALOGUE_CACHE_TTL_SECONDS", "30"))
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+
+    def bump(self):
+        """Start a new catalogue version, dropping everything cached"""
+        self.version += 1
+        self.invalidations += 1
+        self._entries.clear()
+        self._loading.clear()
+
+    def invalidate(self, product_id: Optional[Hashable] = None):
+        """Drop the entries tagged with product_id, or everything if it is None"""
+        if product_id is None:
+            self.bump()
+            return
+        # In-flight loads may have read the product before it changed
+        self.version += 1
+        tag = str(product_id)
+        for key in [key for key, (_, _, tags) in self._entries.items() if tag in tags]:
+            del self._entries[key]
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        tags: Optional[Callable[[Any], Iterable[Hashable]]] = None
+    ) -> Any:
+        """Return the cached value for key, loading it on a miss
+        
+        tags maps a loaded value to the product ids it contains, so that
+        invalidate(product_id) can drop it.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value, _ = entry
+            if expires_at >= time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        # Concurrent misses for one key share a single load
+        loading = self._loading.get(key)
+        if loading is not None:
+            self.hits += 1
+            try:
+                return await asyncio.shield(loading)
+            except asyncio.CancelledError:
+                if not loading.cancelled():
+                    raise
+                # The request that started the load was cancelled; load again
+                return await self.get_or_load(key, loader, tags)
+
+        self.misses += 1
+        version = self.version
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            # Release the waiters, which start their own load
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when no one else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if version == self.version:
+                product_ids = frozenset(str(tag) for tag in tags(value)) if tags else frozenset()
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value, product_ids)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+# Initialize catalogue cache
+catalogue_cache = CatalogueCache()
@@ -0,0 +1,218 @@
+import os
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import logging
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+
+def supported_encodings() -> List[str]:
+    """Encodings in order of preference"""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the preferred encoding the client accepts, if any"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+def encoded_etag(etag: Optional[str], encoding: Optional[str]) -> Optional[str]:
+    """ETag of a body sent with a content coding
+    
+    A strong ETag names one exact representation, so each encoding gets
+    its own tag: "abc" is sent as "abc-gzip" when gzipped.
+    """
+    if not etag or not encoding or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+class _StreamCompressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress = self._compressor.process
+            self.finish = self._compressor.finish
+        else:
+            # wbits 31 writes a gzip header and trailer
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.compress = self._compressor.compress
+            self.finish = self._compressor.flush
+
+def compress(body: bytes, encoding: str) -> bytes:
+    compressor = _StreamCompressor(encoding)
+    return compressor.compress(body) + compressor.finish()
+
+class CompressionMiddleware:
+    """gzip/brotli response compression for bodies of at least minimum_size.
+
+    Streaming responses are compressed chunk by chunk and an ETag is given
+    the encoding suffix. Responses that already carry a Content-Encoding,
+    such as precompressed cache entries, are passed through untouched.
+    """
+
+    def __init__(self, app, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else COMPRESSION_MIN_SIZE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                content_type = headers.get("content-type", "")
+                skip = (
+                    "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or (not more_body and len(body) < self.minimum_size)
+                )
+                if skip:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _StreamCompressor(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "etag" in headers:
+                    headers["ETag"] = encoded_etag(headers["etag"], encoding)
+                if more_body:
+                    del headers["Content-Length"]
+                    await send(start_message)
+                else:
+                    compressed = compressor.compress(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+class PrecompressedCache:
+    """Byte-bounded LRU of compressed response bodies.
+
+    Keys must identify the body's content (e.g. include its ETag) so that
+    stale entries are simply never asked for again and age out.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, minimum_size: Optional[int] = None):
+        self.max_bytes = max_bytes or int(os.getenv("PRECOMPRESSED_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.minimum_size = minimum_size if minimum_size is not None else COMPRESSION_MIN_SIZE
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[bytes, Optional[str]]]" = OrderedDict()
+
+    def get(self, key: Hashable, encoding: str, body_factory: Callable[[], bytes]) -> Tuple[bytes, Optional[str]]:
+        """Return (body, content encoding); bodies under minimum_size stay uncompressed"""
+        cache_key = (key, encoding)
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        body = body_factory()
+        if len(body) < self.minimum_size:
+            return body, None
+
+        entry = (compress(body, encoding), encoding)
+        self._entries[cache_key] = entry
+        self.size_bytes += len(entry[0])
+        while self.size_bytes > self.max_bytes and self._entries:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted)
+        return entry
+
+    def get_metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "encodings": supported_encodings(),
+        }
+
+def precompressed_response(
+    request: Request,
+    cache: PrecompressedCache,
+    key: Hashable,
+    body_factory: Callable[[], bytes],
+    headers: Optional[Dict[str, str]] = None,
+    media_type: str = "application/json"
+) -> Response:
+    """Serve a cacheable body in the client's preferred encoding"""
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    if encoding is None:
+        return Response(content=body_factory(), media_type=media_type, headers=headers)
+
+    body, content_encoding = cache.get(key, encoding, body_factory)
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+        if "ETag" in headers:
+            headers["ETag"] = encoded_etag(headers["ETag"], content_encoding)
+    return Response(content=body, media_type=media_type, headers=headers)
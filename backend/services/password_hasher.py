@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+import logging
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+class HashingPoolBusy(Exception):
+    """Raised when too many hashing operations are already queued"""
+
+class OperationStats:
+    def __init__(self, sample_size: int = 1000):
+        self.count = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.samples = deque(maxlen=sample_size)
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.samples.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = sorted(self.samples)
+        p95 = samples[max(int(len(samples) * 0.95) - 1, 0)] if samples else 0.0
+        return {
+            "count": self.count,
+            "rejected": self.rejected,
+            "avg_ms": round(self.total_seconds / self.count * 1000, 2) if self.count else 0.0,
+            "p95_ms": round(p95 * 1000, 2),
+            "max_ms": round(self.max_seconds * 1000, 2),
+        }
+
+class PasswordHasher:
+    """Runs bcrypt hashing and verification on a bounded thread pool.
+
+    bcrypt releases the GIL, so the event loop keeps serving other requests
+    while a hash is computed. Once more than ``max_queue`` operations are
+    waiting or running, new ones are rejected with HashingPoolBusy instead of
+    piling up behind a login storm.
+    """
+
+    def __init__(self):
+        self.workers = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+        self.max_queue = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self.in_flight = 0
+        self.stats = {"hash": OperationStats(), "verify": OperationStats()}
+
+    async def _run(self, operation: str, func, *args):
+        stats = self.stats[operation]
+        if self.in_flight >= self.max_queue:
+            stats.rejected += 1
+            logger.warning(f"Password hashing pool busy, rejecting {operation}")
+            raise HashingPoolBusy(f"Too many pending {operation} operations")
+
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            stats.record(time.perf_counter() - start)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", self.pwd_context.verify, plain_password, hashed_password)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "operations": {name: stats.snapshot() for name, stats in self.stats.items()},
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+# Initialize password hasher
+password_hasher = PasswordHasher()
@@ -0,0 +1,70 @@
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PrincipalCache:
+    """Bounded LRU cache of authenticated users keyed by token subject (email).
+
+    Entries expire after a TTL so that changes made by another worker are
+    picked up eventually; changes made through this worker invalidate the
+    entry immediately.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size or int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._emails_by_id: Dict[str, str] = {}
+        self._lock = Lock()
+
+    def get(self, email: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                self._remove(email)
+                return None
+
+            self._entries.move_to_end(email)
+            return dict(user)
+
+    def set(self, email: str, user: Dict[str, Any]):
+        with self._lock:
+            self._remove(email)
+            self._entries[email] = (time.monotonic() + self.ttl_seconds, dict(user))
+            self._emails_by_id[str(user["_id"])] = email
+
+            while len(self._entries) > self.max_size:
+                oldest_email = next(iter(self._entries))
+                self._remove(oldest_email)
+
+    def invalidate(self, email: str):
+        with self._lock:
+            self._remove(email)
+
+    def invalidate_user_id(self, user_id: str):
+        with self._lock:
+            email = self._emails_by_id.get(str(user_id))
+            if email:
+                self._remove(email)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._emails_by_id.clear()
+
+    def _remove(self, email: str):
+        entry = self._entries.pop(email, None)
+        if entry is not None:
+            self._emails_by_id.pop(str(entry[1]["_id"]), None)
+
+# Initialize principal cache
+principal_cache = PrincipalCache()
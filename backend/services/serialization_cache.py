@@ -0,0 +1,60 @@
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SerializationCache:
+    """Bounded LRU of serialized JSON fragments, one per document.
+
+    Each entry is stored with the document's version (its updated_at), so a
+    changed document is serialized again on its next read and its old
+    fragment is replaced rather than kept alongside.
+    """
+
+    def __init__(self, serialize: Callable[[Dict[str, Any]], bytes], max_size: Optional[int] = None):
+        self.serialize = serialize
+        self.max_size = max_size or int(os.getenv("SERIALIZATION_CACHE_SIZE", "10000"))
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(
+        self,
+        document_id: Hashable,
+        version: Any,
+        document: Dict[str, Any],
+        serialize: Optional[Callable[[Dict[str, Any]], bytes]] = None
+    ) -> bytes:
+        """Return the cached fragment, serializing the document if it changed
+        
+        serialize overrides the default serializer for entries, such as
+        trimmed views of a document, that are keyed apart from the full one.
+        """
+        entry = self._entries.get(document_id)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(document_id)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        fragment = (serialize or self.serialize)(document)
+        self._entries[document_id] = (version, fragment)
+        self._entries.move_to_end(document_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
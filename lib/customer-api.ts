@@ -67,17 +67,6 @@ export class CustomerApiService {
     }
   }
 
-  // Get customer's orders
-  static async getMyOrders(): Promise<Order[]> {
-    try {
-      const response = await this.apiRequest('/orders/my-orders')
-      return response.orders || []
-    } catch (error) {
-      console.error("Failed to get orders:", error)
-      return []
-    }
-  }
-
   // Get order by ID
   static async getOrderById(orderId: string): Promise<Order | null> {
     try {
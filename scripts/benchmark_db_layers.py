@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent /products and /cart requests against the backend at
+a baseline git ref (the blocking PyMongo data layer) and the backend in
+this checkout (the Motor data layer).
+
+The baseline is checked out into a temporary git worktree and each
+backend is driven in its own process, so both run their own unmodified
+code. Requires a running MongoDB (MONGODB_URL) and httpx:
+    pip install httpx
+    python scripts/benchmark_db_layers.py --baseline 5b5070a --requests 500 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_EMAIL = "bench@glonix.com"
+
+
+def seed():
+    """Make sure the benchmark user and some products exist"""
+    from passlib.context import CryptContext
+    from pymongo import MongoClient
+
+    client = MongoClient(os.getenv("MONGODB_URL", "mongodb://localhost:27018"))
+    db = client[os.getenv("DATABASE_NAME", "glonix_electronics")]
+    if not db.users.find_one({"email": BENCH_EMAIL}):
+        db.users.insert_one({
+            "email": BENCH_EMAIL,
+            "hashed_password": CryptContext(schemes=["bcrypt"]).hash("bench-password"),
+            "full_name": "Benchmark User",
+            "role": "customer",
+            "fabrication_status": 0,
+        })
+    now = datetime.utcnow()
+    for i in range(50):
+        db.products.update_one(
+            {"sku": f"BENCH-{i:04d}"},
+            {"$setOnInsert": {
+                "name": f"Bench Product {i}",
+                "category": "Benchmark",
+                "price": 10.0 + i,
+                "description": "Benchmark product",
+                "stock_quantity": 100,
+                "inStock": True,
+                "created_at": now,
+                "updated_at": now,
+            }},
+            upsert=True
+        )
+    client.close()
+
+
+async def run_load(app, total: int, concurrency: int, token: str) -> list:
+    """Fire alternating /products and /cart requests and return latencies"""
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            path = "/products?limit=50" if i % 2 == 0 else "/cart"
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        await asyncio.gather(*(one(i) for i in range(total)))
+
+    return latencies
+
+
+def report(label: str, latencies: list, elapsed: float):
+    latencies = sorted(latencies)
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    print(
+        f"{label:<10} {len(latencies) / elapsed:8.1f} req/s  "
+        f"p50 {statistics.median(latencies) * 1000:7.2f} ms  "
+        f"p95 {p95 * 1000:7.2f} ms"
+    )
+
+
+async def benchmark(label: str, total: int, concurrency: int):
+    """Drive the backend already on sys.path through its ASGI app"""
+    import main
+
+    token = main.create_access_token({"sub": BENCH_EMAIL})
+
+    # Warm up connection pools before measuring
+    await run_load(main.app, 20, concurrency, token)
+
+    start = time.perf_counter()
+    latencies = await run_load(main.app, total, concurrency, token)
+    report(label, latencies, time.perf_counter() - start)
+
+
+def run_backend(label: str, backend_dir: str, args) -> int:
+    """Benchmark one backend directory in a fresh interpreter"""
+    return subprocess.call(
+        [
+            sys.executable, os.path.abspath(__file__),
+            "--run-backend", backend_dir, "--label", label,
+            "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+        ],
+        cwd=backend_dir
+    )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--baseline", default="5b5070a", help="git ref of the PyMongo backend")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--run-backend", help=argparse.SUPPRESS)
+    parser.add_argument("--label", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_backend:
+        sys.path.insert(0, args.run_backend)
+        asyncio.run(benchmark(args.label, args.requests, args.concurrency))
+        return
+
+    seed()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        worktree = os.path.join(tmp, "baseline")
+        subprocess.check_call(["git", "-C", REPO_ROOT, "worktree", "add", "--detach", worktree, args.baseline])
+        try:
+            failed = run_backend("pymongo", os.path.join(worktree, "backend"), args)
+        finally:
+            subprocess.call(["git", "-C", REPO_ROOT, "worktree", "remove", "--force", worktree])
+
+    failed |= run_backend("motor", os.path.join(REPO_ROOT, "backend"), args)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of product list serialization.
+
+Compares the per-product cost of the previous path (build a ProductResponse
+per product, then FastAPI's jsonable_encoder + json.dumps) with the
+product JSON cache, both cold (every product serialized) and warm (page
+assembled from cached fragments). Needs no database:
+    python scripts/benchmark_product_serialization.py --products 1000 --rounds 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from fastapi.encoders import jsonable_encoder
+
+import main
+
+
+def make_products(count: int) -> list:
+    now = datetime.utcnow()
+    return [{
+        "_id": f"{i:024x}",
+        "name": f"Benchmark Product {i}",
+        "sku": f"BENCH-{i:04d}",
+        "category": "Benchmark",
+        "price": 10.0 + i,
+        "image": f"/images/{i}.png",
+        "images": [f"/images/{i}.png", f"/images/{i}-b.png"],
+        "description": "Benchmark product",
+        "long_description": "Long description " * 40,
+        "inStock": True,
+        "stock_quantity": 100,
+        "rating": 4.5,
+        "reviews": 12,
+        "specifications": {f"spec_{k}": f"value {k}" for k in range(12)},
+        "features": [f"Feature {k}" for k in range(8)],
+        "applications": [f"Application {k}" for k in range(5)],
+        "created_at": now,
+        "updated_at": now,
+    } for i in range(count)]
+
+
+def previous_path(page: dict, skip: int, limit: int) -> bytes:
+    body = {
+        "products": [main.product_response(product) for product in page["items"]],
+        "total": page["total"],
+        "skip": skip,
+        "limit": limit,
+        "next_cursor": page["next_cursor"],
+    }
+    return json.dumps(jsonable_encoder(body)).encode()
+
+
+def cached_path(page: dict, skip: int, limit: int) -> bytes:
+    return main.products_page_response(page, skip, limit).body
+
+
+def measure(label: str, func, page: dict, rounds: int, before_round=None):
+    elapsed = 0.0
+    for _ in range(rounds):
+        if before_round:
+            before_round()
+        start = time.perf_counter()
+        func(page, 0, len(page["items"]))
+        elapsed += time.perf_counter() - start
+    per_item = elapsed / (rounds * len(page["items"])) * 1_000_000
+    print(f"{label:<12} {per_item:8.2f} us/product  {elapsed / rounds * 1000:8.2f} ms/page")
+    return per_item
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    page = {"items": make_products(args.products), "total": args.products, "next_cursor": None}
+    if json.loads(previous_path(page, 0, args.products)) != json.loads(cached_path(page, 0, args.products)):
+        print("FAILED: cached response differs from the previous response")
+        sys.exit(1)
+
+    before = measure("previous", previous_path, page, args.rounds)
+    measure("cache cold", cached_path, page, args.rounds, before_round=main.product_json_cache.clear)
+    after = measure("cache warm", cached_path, page, args.rounds)
+    print(f"warm cache is {before / after:.1f}x faster per product")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Contention benchmark for stock reservations on a hot SKU.
+
+Fires many concurrent reserve_stock calls that all want the same product,
+each reservation also holding some lines of ample-stock products, then
+releases every successful reservation. Checks that exactly the available
+stock was sold, that stock never went negative, and that failed
+reservations put back the lines they had already taken.
+
+Requires a running MongoDB (MONGODB_URL):
+    python scripts/benchmark_stock_reservations.py --reservations 2000 --stock 500 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from bson import ObjectId
+
+from database import InsufficientStock, get_database
+
+BENCH_USER_ID = "reservation-bench"
+HOT_SKU = "HOT-SKU-0001"
+COLD_SKU = "COLD-SKU-{:04d}"
+COLD_STOCK = 1_000_000
+
+
+async def seed_product(db_manager, sku: str, stock: int) -> str:
+    await db_manager.db.products.update_one(
+        {"sku": sku},
+        {
+            "$set": {"stock_quantity": stock, "reserved_quantity": 0, "inStock": stock > 0},
+            "$setOnInsert": {
+                "name": f"Reservation Bench {sku}",
+                "sku": sku,
+                "category": "Benchmark",
+                "price": 1.0,
+                "description": "Stock reservation benchmark product",
+                "price_version": 1,
+            },
+        },
+        upsert=True
+    )
+    product = await db_manager.db.products.find_one({"sku": sku}, {"_id": 1})
+    return str(product["_id"])
+
+
+async def stock_of(db_manager, product_id: str) -> tuple:
+    product = await db_manager.db.products.find_one({"_id": ObjectId(product_id)})
+    return product["stock_quantity"], product.get("reserved_quantity", 0)
+
+
+def report(label: str, latencies: list, elapsed: float):
+    latencies = sorted(latencies)
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    print(
+        f"{label:<10} {len(latencies) / elapsed:8.1f} ops/s  "
+        f"p50 {statistics.median(latencies) * 1000:7.2f} ms  "
+        f"p95 {p95 * 1000:7.2f} ms"
+    )
+
+
+async def run(total: int, stock: int, concurrency: int, cart_lines: int) -> int:
+    db_manager = get_database()
+    await db_manager.ensure_indexes()
+    await db_manager.db.stock_reservations.delete_many({"user_id": BENCH_USER_ID})
+
+    hot_id = await seed_product(db_manager, HOT_SKU, stock)
+    cold_ids = [await seed_product(db_manager, COLD_SKU.format(i), COLD_STOCK) for i in range(cart_lines - 1)]
+    items = [{"product_id": product_id, "quantity": 1} for product_id in [*cold_ids, hot_id]]
+
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes = Counter()
+    reservation_ids = []
+    latencies = []
+
+    async def reserve():
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                reservation_ids.append(await db_manager.reserve_stock(BENCH_USER_ID, items))
+                outcomes["reserved"] += 1
+            except InsufficientStock:
+                outcomes["insufficient"] += 1
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(reserve() for _ in range(total)))
+    report("reserve", latencies, time.perf_counter() - start)
+
+    hot_after = await stock_of(db_manager, hot_id)
+    cold_after = [await stock_of(db_manager, product_id) for product_id in cold_ids]
+    print(f"outcomes: {dict(outcomes)}")
+    print(f"hot sku stock/reserved after reserve: {hot_after}")
+
+    failed = False
+    expected = min(total, stock)
+    if outcomes["reserved"] != expected or hot_after != (stock - expected, expected):
+        print(f"FAILED: expected {expected} reservations and hot stock {(stock - expected, expected)}")
+        failed = True
+    if any(cold != (COLD_STOCK - expected, expected) for cold in cold_after):
+        print(f"FAILED: cold lines not rolled back correctly: {cold_after}")
+        failed = True
+
+    latencies = []
+
+    async def release(reservation_id: str):
+        async with semaphore:
+            begin = time.perf_counter()
+            await db_manager.release_reservation(reservation_id)
+            latencies.append(time.perf_counter() - begin)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(release(reservation_id) for reservation_id in reservation_ids))
+    if latencies:
+        report("release", latencies, time.perf_counter() - start)
+
+    hot_after = await stock_of(db_manager, hot_id)
+    if hot_after != (stock, 0):
+        print(f"FAILED: hot stock after release {hot_after}, expected {(stock, 0)}")
+        failed = True
+
+    await db_manager.db.stock_reservations.delete_many({"user_id": BENCH_USER_ID})
+    db_manager.close()
+
+    if failed:
+        return 1
+    print("OK: no oversell, failed reservations rolled back, released stock restored")
+    return 0
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reservations", type=int, default=2000)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--cart-lines", type=int, default=3)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.reservations, args.stock, args.concurrency, args.cart_lines)))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Durability check for the write-behind cart store.
+
+Starts the API with uvicorn, adds an item to a cart and stops the worker
+while the cart write is still waiting out its delay:
+
+* SIGTERM (graceful shutdown) must flush the cart to MongoDB.
+* SIGKILL lands before the delay runs out, so the stored cart must be
+  exactly the cart the SIGTERM run flushed: the pending change is lost and
+  nothing else changes.
+
+Requires a running MongoDB (MONGODB_URL), uvicorn and httpx:
+    pip install httpx
+    python scripts/check_cart_durability.py
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from jose import jwt
+from pymongo import MongoClient
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27018")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "glonix_electronics")
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
+PORT = int(os.getenv("CHECK_PORT", "8765"))
+WRITE_DELAY = 5.0
+
+CHECK_EMAIL = "cart-check@glonix.com"
+CHECK_SKU = "CART-CHECK-0001"
+
+
+def prepare(db):
+    """Create the check user and product and empty the user's cart"""
+    now = datetime.utcnow()
+    db.users.update_one(
+        {"email": CHECK_EMAIL},
+        {"$setOnInsert": {
+            "email": CHECK_EMAIL,
+            "hashed_password": "not-used",
+            "full_name": "Cart Check",
+            "role": "customer",
+            "is_active": True,
+            "fabrication_status": 0,
+            "created_at": now,
+            "updated_at": now,
+        }},
+        upsert=True
+    )
+    db.products.update_one(
+        {"sku": CHECK_SKU},
+        {"$setOnInsert": {
+            "name": "Cart Check Item",
+            "sku": CHECK_SKU,
+            "category": "Check",
+            "price": 1.0,
+            "description": "Cart durability check item",
+            "stock_quantity": 100,
+            "inStock": True,
+            "created_at": now,
+            "updated_at": now,
+        }},
+        upsert=True
+    )
+    user = db.users.find_one({"email": CHECK_EMAIL})
+    product = db.products.find_one({"sku": CHECK_SKU})
+    db.carts.delete_one({"user_id": str(user["_id"])})
+    return str(user["_id"]), str(product["_id"])
+
+
+def start_server():
+    env = {**os.environ, "CART_WRITE_DELAY_SECONDS": str(WRITE_DELAY)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT)],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/health", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("API did not start")
+
+
+def stored_items(db, user_id: str) -> list:
+    cart = db.carts.find_one({"user_id": user_id}) or {"items": []}
+    return cart["items"]
+
+
+def quantity_of(items: list, product_id: str) -> int:
+    return sum(item["quantity"] for item in items if item["product_id"] == product_id)
+
+
+def add_and_stop(db, user_id: str, stop_signal, product_id: str) -> tuple:
+    """Add one item, stop the worker mid-delay and return the stored items
+    before and after, and the seconds between the add and the signal"""
+    token = jwt.encode(
+        {"sub": CHECK_EMAIL, "exp": datetime.utcnow() + timedelta(minutes=5)},
+        SECRET_KEY,
+        algorithm="HS256"
+    )
+    before = stored_items(db, user_id)
+
+    process = start_server()
+    try:
+        response = httpx.post(
+            f"http://127.0.0.1:{PORT}/cart/add",
+            json={"product_id": product_id, "quantity": 1},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        response.raise_for_status()
+        added_at = time.monotonic()
+        time.sleep(WRITE_DELAY / 5)
+        process.send_signal(stop_signal)
+        elapsed = time.monotonic() - added_at
+        process.wait(timeout=30)
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+    return before, stored_items(db, user_id), elapsed
+
+
+def main():
+    db = MongoClient(MONGODB_URL)[DATABASE_NAME]
+    user_id, product_id = prepare(db)
+    failed = False
+
+    before, flushed, _ = add_and_stop(db, user_id, signal.SIGTERM, product_id)
+    expected = quantity_of(before, product_id) + 1
+    if quantity_of(flushed, product_id) == expected:
+        print(f"SIGTERM: OK, pending cart change flushed on shutdown (quantity {expected})")
+    else:
+        print(f"SIGTERM: FAILED, expected quantity {expected}, stored {quantity_of(flushed, product_id)}")
+        failed = True
+
+    before, after, elapsed = add_and_stop(db, user_id, signal.SIGKILL, product_id)
+    if elapsed >= WRITE_DELAY:
+        print(f"SIGKILL: FAILED, signal sent {elapsed:.1f}s after the add, past the {WRITE_DELAY}s write delay")
+        failed = True
+    elif before != flushed:
+        print(f"SIGKILL: FAILED, cart changed between runs: {flushed} -> {before}")
+        failed = True
+    elif after == flushed:
+        print(f"SIGKILL: OK, stored cart is exactly the last flush (quantity {quantity_of(after, product_id)})")
+    else:
+        print(f"SIGKILL: FAILED, expected the last flushed cart {flushed}, stored {after}")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Concurrency check for order number allocation.
+
+Fires many parallel POST /orders requests through the ASGI app and verifies
+that every order was created on the first attempt with a distinct order
+number. Requires a running MongoDB (MONGODB_URL) and httpx:
+    pip install httpx
+    python scripts/check_order_numbers.py --orders 2000 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import httpx
+
+import main
+
+CHECK_EMAIL = "order-check@glonix.com"
+CHECK_SKU = "ORDER-CHECK-0001"
+
+ADDRESS = {
+    "first_name": "Order",
+    "last_name": "Check",
+    "address1": "1 Test Street",
+    "city": "Chennai",
+    "state": "TN",
+    "zip_code": "600001",
+    "country": "IN",
+}
+
+ORDER = {
+    "items": [{
+        "product_id": None,
+        "product_name": "Order Check Item",
+        "product_sku": CHECK_SKU,
+        "price": 1.0,
+        "quantity": 1,
+        "total": 1.0,
+    }],
+    "shipping_address": ADDRESS,
+    "billing_address": ADDRESS,
+    "shipping_method": "standard",
+    "payment_method": "cod",
+    "subtotal": 1.0,
+    "shipping_cost": 0.0,
+    "tax": 0.0,
+    "total": 1.0,
+}
+
+
+async def ensure_user() -> str:
+    user = await main.db_manager.get_user_by_email(CHECK_EMAIL)
+    if not user:
+        await main.db_manager.create_user({
+            "email": CHECK_EMAIL,
+            "hashed_password": "not-used",
+            "full_name": "Order Check",
+            "role": "customer",
+            "fabrication_status": 0,
+        })
+        user = await main.db_manager.get_user_by_email(CHECK_EMAIL)
+    return str(user["_id"])
+
+
+async def ensure_product(stock: int) -> str:
+    """Create the check product with enough stock for every order"""
+    await main.db_manager.db.products.update_one(
+        {"sku": CHECK_SKU},
+        {
+            "$set": {"stock_quantity": stock, "reserved_quantity": 0, "inStock": True},
+            "$setOnInsert": {
+                "name": "Order Check Item",
+                "sku": CHECK_SKU,
+                "category": "Check",
+                "price": 1.0,
+                "description": "Order number check item",
+                "price_version": 1,
+            },
+        },
+        upsert=True
+    )
+    product = await main.db_manager.db.products.find_one({"sku": CHECK_SKU}, {"_id": 1})
+    return str(product["_id"])
+
+
+async def run(total: int, concurrency: int) -> int:
+    user_id = await ensure_user()
+    ORDER["items"][0]["product_id"] = await ensure_product(total)
+    await main.db_manager.db.orders.delete_many({"user_id": user_id})
+
+    token = main.create_access_token({"sub": CHECK_EMAIL})
+    headers = {"Authorization": f"Bearer {token}"}
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=main.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=60) as client:
+        async def place_order():
+            async with semaphore:
+                response = await client.post("/orders", json=ORDER, headers=headers)
+                return response.status_code
+
+        statuses = Counter(await asyncio.gather(*(place_order() for _ in range(total))))
+
+    orders = await main.db_manager.db.orders.find(
+        {"user_id": user_id}, {"order_number": 1}
+    ).to_list(length=None)
+    numbers = Counter(order["order_number"] for order in orders)
+    duplicates = {number: count for number, count in numbers.items() if count > 1}
+
+    print(f"responses: {dict(statuses)}")
+    print(f"orders stored: {len(orders)}, distinct numbers: {len(numbers)}")
+    await main.db_manager.db.orders.delete_many({"user_id": user_id})
+
+    if statuses.get(200) != total or len(orders) != total or duplicates:
+        print(f"FAILED: duplicates={duplicates}")
+        return 1
+
+    print("OK: every order succeeded first time with a unique number")
+    return 0
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.orders, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main_cli()